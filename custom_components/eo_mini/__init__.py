@@ -8,28 +8,51 @@ https://github.com/twhittock/eo_mini
 import asyncio
 from datetime import timedelta
 import logging
+from time import monotonic
 
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
-from homeassistant.exceptions import ConfigEntryAuthFailed
-from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.exceptions import ConfigEntryAuthFailed, ConfigEntryNotReady
 from homeassistant.helpers.typing import ConfigType
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
 
 from .api import EOApiClient, EOAuthError
+from .history import EOHistoryImporter
+from .metrics import EOLatencyStats
+from .models import EOChargerSnapshot, EOMini, EOSession
+from .registry import async_forget_client, async_get_client
+from .scheduler import EOPollScheduler
+from .storage import EOAccountCache
 
 from .const import (
+    CONF_CHARGING_POLL_INTERVAL,
+    CONF_FIRST_REFRESH_TIMEOUT,
+    CONF_IDLE_POLL_INTERVAL,
     CONF_PASSWORD,
     CONF_USERNAME,
     CONF_POLL_INTERVAL,
+    DEFAULT_CHARGING_POLL_INTERVAL,
+    DEFAULT_FIRST_REFRESH_TIMEOUT,
+    DEFAULT_IDLE_POLL_INTERVAL,
     DEFAULT_POLL_INTERVAL,
     DOMAIN,
+    LIVENESS_PROBE_INTERVAL,
     PLATFORMS,
     STARTUP_MESSAGE,
 )
 
 _LOGGER: logging.Logger = logging.getLogger(__package__)
 
+# Session fields entities can subscribe to, see EODataUpdateCoordinator.changed_fields
+SESSION_FIELDS = ("pi_time", "eskwh", "charging_time")
+
+# The energy counted towards the lifetime total, see EODataUpdateCoordinator.lifetime
+EMPTY_LIFETIME = {
+    "total": 0.0,  # Wh, including the current session's
+    "pi_time": None,  # start of the last session counted
+    "session": 0.0,  # Wh of that session counted so far
+}
+
 
 def eo_model(hub_serial: str):
     "Get a model from the serial number"
@@ -46,81 +69,411 @@ def eo_model(hub_serial: str):
 # pylint: disable-next=unused-argument
 async def async_setup(hass: HomeAssistant, config: ConfigType):
     "Setting up this integration using YAML is not supported."
+    _LOGGER.info(STARTUP_MESSAGE)
     return True
 
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
     """Set up this integration using UI."""
-    if hass.data.get(DOMAIN) is None:
-        hass.data.setdefault(DOMAIN, {})
-        _LOGGER.info(STARTUP_MESSAGE)
+    hass.data.setdefault(DOMAIN, {})
 
     username = entry.data.get(CONF_USERNAME)
     password = entry.data.get(CONF_PASSWORD)
 
-    session = async_get_clientsession(hass)
-    client = EOApiClient(username, password, session)
+    client = async_get_client(hass, username, password)
+
+    cache = EOAccountCache(hass, entry.entry_id)
+    cached = await cache.async_load()
+
+    scheduler = EOPollScheduler(
+        charging=timedelta(
+            seconds=entry.options.get(
+                CONF_CHARGING_POLL_INTERVAL, DEFAULT_CHARGING_POLL_INTERVAL
+            )
+        ),
+        connected=timedelta(
+            minutes=entry.options.get(CONF_POLL_INTERVAL, DEFAULT_POLL_INTERVAL)
+        ),
+        idle=timedelta(
+            minutes=entry.options.get(
+                CONF_IDLE_POLL_INTERVAL, DEFAULT_IDLE_POLL_INTERVAL
+            )
+        ),
+        probe=timedelta(seconds=LIVENESS_PROBE_INTERVAL),
+    )
 
     coordinator = EODataUpdateCoordinator(
         hass,
         client=client,
-        poll_interval=entry.options.get(CONF_POLL_INTERVAL, DEFAULT_POLL_INTERVAL),
+        scheduler=scheduler,
+        cache=cache,
     )
     hass.data[DOMAIN][entry.entry_id] = coordinator
 
-    await coordinator.async_config_entry_first_refresh()
+    restored = coordinator.async_restore(cached)
+
+    # Connect and log in at once rather than one after the other in the first
+    # refresh, which waits for the login if it needs the token first.
+    entry.async_create_background_task(
+        hass, client.async_warm_up(), f"{DOMAIN} warm-up"
+    )
+
+    # The entities restore their last states, so setup never waits for the cloud
+    # longer than it must: not at all if the charger list is cached, and otherwise
+    # no longer than the deadline, after which the entities are added once the
+    # refresh finds the chargers.
+    first_refresh = entry.async_create_background_task(
+        hass, coordinator.async_refresh(), f"{DOMAIN} first refresh"
+    )
+    if not restored:
+        deadline = entry.options.get(
+            CONF_FIRST_REFRESH_TIMEOUT, DEFAULT_FIRST_REFRESH_TIMEOUT
+        )
+        try:
+            await asyncio.wait_for(asyncio.shield(first_refresh), deadline)
+        except asyncio.TimeoutError:
+            _LOGGER.warning(
+                "EO didn't answer within %ss, carrying on in the background", deadline
+            )
+        else:
+            if isinstance(coordinator.last_exception, ConfigEntryAuthFailed):
+                # Retrying with credentials EO rejected won't help.
+                raise coordinator.last_exception
+            if not coordinator.last_update_success:
+                # Nothing is known about the account yet, so let Home Assistant
+                # retry the setup later.
+                raise ConfigEntryNotReady from coordinator.last_exception
 
     coordinator.platforms.extend(PLATFORMS)
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
 
+    if "recorder" in hass.config.components:
+        importer = EOHistoryImporter(hass, client, cache, entry.entry_id)
+        entry.async_create_background_task(
+            hass, importer.async_import(), f"{DOMAIN} history import"
+        )
+
     entry.async_on_unload(entry.add_update_listener(async_reload_entry))
     return True
 
 
 class EODataUpdateCoordinator(DataUpdateCoordinator):
-    "Class to manage fetching data from the API."
+    """
+    Class to manage fetching data from the API.
+
+    Scheduled refreshes between the scheduler's full polls only probe the cheap
+    liveness endpoint, and fetch everything early when it changes. Refreshes
+    asked for any other way always fetch everything.
+    """
 
     api: EOApiClient
 
     def __init__(
-        self, hass: HomeAssistant, client: EOApiClient, poll_interval: int
+        self,
+        hass: HomeAssistant,
+        client: EOApiClient,
+        scheduler: EOPollScheduler,
+        cache: EOAccountCache | None = None,
     ) -> None:
         "Initialize."
         self.api = client
+        self.scheduler = scheduler
+        self.cache = cache
         self.platforms = []
-        self.device = {}
-        self.serial = ""
-        self.model = ""
+        self.devices: dict[str, EOMini] = {}
+        self.snapshots: dict[str | None, EOChargerSnapshot] = {}
+        self.live_session = False
+        self.polled = False  # whether EO has answered since setup
+        self.fetch_timings = {}
+        self.refresh_stats = EOLatencyStats()
+        self.changed_fields: set[tuple[str, str]] | None = None
+        self.lifetime = EMPTY_LIFETIME
+        self._field_values = {}
         self._user_data = None
         self._minis_list = None
+        self._scheduled = False
 
         super().__init__(
             hass,
             _LOGGER,
             name=DOMAIN,
-            update_interval=timedelta(minutes=poll_interval),
+            update_interval=scheduler.connected,
         )
 
+    async def _handle_refresh_interval(self, _now=None) -> None:
+        "Refresh on the update interval, which may only need a probe"
+        self._scheduled = True
+        try:
+            await super()._handle_refresh_interval(_now)
+        finally:
+            self._scheduled = False
+
     async def _async_update_data(self):
         """Update data via library."""
+        start = monotonic()
+        try:
+            live_session = None
+            if (
+                self._scheduled
+                and self.last_update_success
+                and self._minis_list is not None
+                and not self.scheduler.full_fetch_due
+            ):
+                live_session = await self._async_probe()
+                if live_session == self.live_session:
+                    self._take_snapshots(self.data)
+                    return self.data
+            return await self._async_fetch_data(live_session)
+        finally:
+            self.refresh_stats.record(monotonic() - start)
+
+    async def _async_probe(self) -> bool | None:
+        "Whether a vehicle is connected, None if that couldn't be found out"
         try:
-            if not self._user_data:
-                self._user_data = await self.api.async_get_user()
-
-            self._minis_list = await self.api.async_get_list()
-            assert len(self._minis_list) == 1
-            self.device = self._minis_list[0]
-            self.serial = self.device["hubSerial"]
-            self.model = eo_model(self.serial)
-            self.live_session = await self.api.async_get_session_liveness()
-            self.data = await self.api.async_get_session()
-
-            self.async_update_listeners()
+            return await self._async_timed(
+                "liveness", self.api.async_get_session_liveness()
+            )
         except EOAuthError as exception:
             raise ConfigEntryAuthFailed from exception
+        except Exception as exception:  # pylint: disable=broad-except
+            _LOGGER.debug("Liveness probe failed, fetching everything: %s", exception)
+            return None
+
+    async def _async_fetch_data(self, live_session: bool | None = None):
+        """
+        Fetch everything concurrently, keeping the last good value of failed calls.
+
+        live_session is the result of a probe just made, if any, to save asking
+        again.
+        """
+        calls = {
+            "list": self.api.async_get_list(),
+            "session": self.api.async_get_session(),
+        }
+        if live_session is None:
+            calls["liveness"] = self.api.async_get_session_liveness()
+        if not self._user_data:
+            calls["user"] = self.api.async_get_user()
+
+        results = dict(
+            zip(
+                calls,
+                await asyncio.gather(
+                    *(self._async_timed(name, call) for name, call in calls.items()),
+                    return_exceptions=True,
+                ),
+            )
+        )
+        if live_session is not None:
+            results["liveness"] = live_session
+        _LOGGER.debug("Fetch timings: %r", self.fetch_timings)
+
+        failures = {
+            name: result
+            for name, result in results.items()
+            if isinstance(result, Exception)
+        }
+        for exception in failures.values():
+            if isinstance(exception, EOAuthError):
+                raise ConfigEntryAuthFailed from exception
+
+        # Without a charger list there is nothing to attach the other results to,
+        # and if every call failed there is nothing worth keeping either.
+        if ("list" in failures and self._minis_list is None) or len(failures) == len(
+            results
+        ):
+            name, exception = next(iter(failures.items()))
+            raise UpdateFailed(f"Fetching {name} failed: {exception}") from exception
+
+        for name, exception in failures.items():
+            _LOGGER.warning(
+                "Fetching %s failed, keeping last value: %s", name, exception
+            )
+
+        try:
+            if "user" in results and "user" not in failures:
+                self._user_data = results["user"]
+
+            if "list" not in failures:
+                self._set_minis_list(results["list"])
+
+            if "liveness" not in failures:
+                self.live_session = results["liveness"]
+
+            if "session" not in failures:
+                self._count_session(results["session"])
+
+            if self.cache:
+                self.cache.async_update(
+                    token=self.api.token_state,
+                    user=self._user_data,
+                    minis=[mini.as_json() for mini in self._minis_list],
+                    lifetime=self.lifetime,
+                )
+
+            data = results["session"] if "session" not in failures else self.data
+            self.update_interval = self.scheduler.next_interval(self.live_session, data)
+            self.polled = True
+            self._take_snapshots(data)
+            return data
         except Exception as exception:
             raise UpdateFailed() from exception
 
+    async def async_refresh_list(self) -> None:
+        "Fetch only the charger list, e.g. to confirm a lock change"
+        self._set_minis_list(await self.api.async_get_list())
+        self._take_snapshots(self.data)
+        self.async_update_listeners()
+
+        # The next full poll would otherwise wait out the interval chosen before
+        # the lock was toggled, long after the fast polling window has closed.
+        if (
+            self.scheduler.fast_polling
+            and self.update_interval > self.scheduler.charging
+        ):
+            self.update_interval = self.scheduler.charging
+            self._schedule_refresh()
+
+    @callback
+    def async_restore(self, cached: dict) -> bool:
+        "Seed the client and coordinator from the cache, returning whether it was usable"
+        # A client shared with another entry or a reload may already be logged in.
+        if cached.get("token") and not self.api.token_state:
+            self.api.restore_token(cached["token"])
+
+        self._user_data = cached.get("user")
+        self.lifetime = {**EMPTY_LIFETIME, **(cached.get("lifetime") or {})}
+        if not cached.get("minis"):
+            return False
+
+        self._set_minis_list(EOMini.from_json_list(cached["minis"]))
+        self._take_snapshots(None)
+        return True
+
+    @callback
+    def async_restore_lifetime(self, total: float) -> None:
+        """
+        Carry on from an entity's restored lifetime total if the cache lost it.
+
+        The current session may then be counted again, but the total never goes
+        backwards.
+        """
+        if total > self.lifetime["total"]:
+            self.lifetime = {**self.lifetime, "total": total}
+
+    @callback
+    def async_update_listeners(self) -> None:
+        """
+        Update the listeners interested in the fields that changed.
+
+        Entities subscribe by passing a set of (serial, field) pairs as their
+        coordinator context. Listeners without a context, and every listener when
+        the changes aren't known (e.g. availability changed), are always updated.
+        """
+        changed = self.changed_fields
+        self.changed_fields = None
+        for update_callback, context in list(self._listeners.values()):
+            if changed is None or context is None or not context.isdisjoint(changed):
+                update_callback()
+
+    @property
+    def session_serial(self) -> str | None:
+        """
+        The serial of the charger whose entities show the session.
+
+        EO reports a single session and liveness per account, and neither payload
+        says which charger it is on. With one charger it can only be that one;
+        with more, the session is shown on account-level entities, which use None.
+        """
+        if len(self.devices) == 1:
+            return next(iter(self.devices))
+        return None
+
+    def _take_snapshots(self, session: EOSession | None) -> None:
+        """
+        Build the snapshots the entities read from the latest data.
+
+        Also records which (serial, field) pairs changed since the last refresh.
+        """
+        session_serial = self.session_serial
+        snapshots = {
+            serial: EOChargerSnapshot(
+                device,
+                session if serial == session_serial else None,
+                self.live_session and serial == session_serial,
+            )
+            for serial, device in self.devices.items()
+        }
+        if session_serial is None and self.devices:
+            snapshots[None] = EOChargerSnapshot(None, session, self.live_session)
+        self.snapshots = snapshots
+
+        values = {
+            (serial, "is_disabled"): device.is_disabled
+            for serial, device in self.devices.items()
+        }
+        values[(session_serial, "live_session")] = self.live_session
+        values[(session_serial, "lifetime_energy")] = self.lifetime["total"]
+        for field in SESSION_FIELDS:
+            values[(session_serial, field)] = (
+                getattr(session, field) if session else None
+            )
+
+        previous = self._field_values
+        self._field_values = values
+        self.changed_fields = (
+            {
+                key
+                for key in values.keys() | previous.keys()
+                if values.get(key) != previous.get(key)
+            }
+            # Coming back from a failure every entity needs to become available.
+            if self.last_update_success
+            else None
+        )
+
+    def _count_session(self, session: EOSession | None) -> None:
+        """
+        Add the energy the session delivered since the last poll to the lifetime.
+
+        Sessions are told apart by when they started, so each one's energy is
+        counted once however many polls see it. Energy delivered after the last
+        poll of a session is lost, as EO doesn't report ended sessions.
+        """
+        if session is None:
+            return
+
+        lifetime = self.lifetime
+        if session.pi_time != lifetime["pi_time"]:
+            if (
+                lifetime["pi_time"] is not None
+                and session.pi_time < lifetime["pi_time"]
+            ):
+                return  # An older session than the one counted, already counted
+            lifetime = {**lifetime, "pi_time": session.pi_time, "session": 0.0}
+
+        if (delta := session.energy - lifetime["session"]) > 0:
+            lifetime = {
+                **lifetime,
+                "total": lifetime["total"] + delta,
+                "session": session.energy,
+            }
+        # Replaced rather than changed, so the cache can tell it changed.
+        self.lifetime = lifetime
+
+    def _set_minis_list(self, minis_list: list[EOMini]) -> None:
+        "Index the chargers in the /api/mini/list payload by serial"
+        self._minis_list = minis_list
+        self.devices = {mini.hub_serial: mini for mini in minis_list}
+
+    async def _async_timed(self, name: str, call):
+        "Await an API call, recording how long it took in fetch_timings"
+        start = monotonic()
+        try:
+            return await call
+        finally:
+            self.fetch_timings[name] = monotonic() - start
+
 
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Handle removal of an entry."""
@@ -139,6 +492,19 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     return unloaded
 
 
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Delete the cached account data when the entry is removed."""
+    await EOAccountCache(hass, entry.entry_id).async_remove()
+
+    username = entry.data.get(CONF_USERNAME)
+    if not any(
+        other.data.get(CONF_USERNAME) == username
+        for other in hass.config_entries.async_entries(DOMAIN)
+        if other.entry_id != entry.entry_id
+    ):
+        async_forget_client(hass, username)
+
+
 async def async_reload_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
     """Reload config entry."""
     await async_unload_entry(hass, entry)
@@ -5,30 +5,38 @@ from homeassistant.components.binary_sensor import (
     BinarySensorEntityDescription,
     BinarySensorDeviceClass,
 )
+from homeassistant.const import STATE_ON
 from homeassistant.core import callback
+from homeassistant.helpers.restore_state import RestoreEntity
 
 from custom_components.eo_mini import EODataUpdateCoordinator
 from .const import DOMAIN
-from .entity import EOMiniChargerEntity
+from .entity import EOMiniChargerEntity, async_add_charger_entities
 
 
 async def async_setup_entry(hass, entry, async_add_devices):
     """Setup binary sensor platform."""
     coordinator: EODataUpdateCoordinator = hass.data[DOMAIN][entry.entry_id]
-    async_add_devices(
-        [
-            EOMiniChargerVehicleConnectedSensor(coordinator),
-        ]
+    async_add_charger_entities(
+        entry,
+        coordinator,
+        async_add_devices,
+        lambda: [
+            EOMiniChargerVehicleConnectedSensor(coordinator, coordinator.session_serial)
+        ],
     )
 
 
-class EOMiniChargerVehicleConnectedSensor(EOMiniChargerEntity, BinarySensorEntity):
+class EOMiniChargerVehicleConnectedSensor(
+    EOMiniChargerEntity, BinarySensorEntity, RestoreEntity
+):
     """EO Mini Charger vehicle connected binary sensor class."""
 
     coordinator: EODataUpdateCoordinator
 
     _attr_icon = "mdi:car-electric"
     _attr_device_class = BinarySensorDeviceClass.CONNECTIVITY
+    _watched_fields = ("live_session",)
     _previous_state = None
 
     def __init__(self, *args):
@@ -40,13 +48,20 @@ class EOMiniChargerVehicleConnectedSensor(EOMiniChargerEntity, BinarySensorEntit
         self._attr_is_on = False
         super().__init__(*args)
 
+    async def async_added_to_hass(self) -> None:
+        """Show whether a vehicle was connected until EO is polled."""
+        if (last_state := await self.async_get_last_state()) is not None:
+            self._attr_is_on = last_state.state == STATE_ON
+        await super().async_added_to_hass()
+
     @callback
     def _handle_coordinator_update(self) -> None:
         """Handle updated data from the coordinator."""
-        self._attr_is_on = self.coordinator.live_session
-        self.async_write_ha_state()
+        if self.coordinator.polled:
+            self._attr_is_on = self.snapshot.vehicle_connected
+        self._async_write_if_changed()
 
     @property
     def unique_id(self):
         """Return a unique ID for this entity."""
-        return f"{DOMAIN}_charger_{self.coordinator.serial}_vehicle_connected"
+        return f"{self.unique_id_prefix}_vehicle_connected"
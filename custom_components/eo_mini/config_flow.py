@@ -6,16 +6,22 @@ import voluptuous as vol
 from homeassistant import config_entries
 from homeassistant.config_entries import ConfigEntry, ConfigFlow, OptionsFlow
 from homeassistant.core import callback
-from homeassistant.helpers.aiohttp_client import async_create_clientsession
 
-from .api import EOApiClient, EOAuthError
+from .api import EOAuthError
 from .const import (
+    CONF_CHARGING_POLL_INTERVAL,
+    CONF_FIRST_REFRESH_TIMEOUT,
+    CONF_IDLE_POLL_INTERVAL,
     CONF_PASSWORD,
     CONF_USERNAME,
     CONF_POLL_INTERVAL,
+    DEFAULT_CHARGING_POLL_INTERVAL,
+    DEFAULT_FIRST_REFRESH_TIMEOUT,
+    DEFAULT_IDLE_POLL_INTERVAL,
     DEFAULT_POLL_INTERVAL,
     DOMAIN,
 )
+from .registry import async_forget_client, async_get_client
 
 _LOGGER: logging.Logger = logging.getLogger(__package__)
 
@@ -49,9 +55,8 @@ class EOMiniFlowHandler(ConfigFlow, domain=DOMAIN):
             )
 
             try:
-                session = async_create_clientsession(self.hass)
-                client = EOApiClient(
-                    user_input[CONF_USERNAME], user_input[CONF_PASSWORD], session
+                client = async_get_client(
+                    self.hass, user_input[CONF_USERNAME], user_input[CONF_PASSWORD]
                 )
 
                 # make a call to the API to verify credentials.
@@ -62,6 +67,7 @@ class EOMiniFlowHandler(ConfigFlow, domain=DOMAIN):
                 )
             except EOAuthError as ex:
                 _LOGGER.warning("Authorisation error during config flow: %s", str(ex))
+                async_forget_client(self.hass, user_input[CONF_USERNAME])
                 self._errors["base"] = "auth"
             except Exception as ex:  # pylint: disable=broad-except
                 _LOGGER.error("Unexpected error during config flow: %s", str(ex))
@@ -129,6 +135,24 @@ class EOMiniOptionsFlowHandler(OptionsFlow):
                         ),
                         msg="poll_interval_mins",
                     ): vol.All(vol.Coerce(int), vol.Range(min=1)),
+                    vol.Required(
+                        CONF_CHARGING_POLL_INTERVAL,
+                        default=self.options.get(
+                            CONF_CHARGING_POLL_INTERVAL, DEFAULT_CHARGING_POLL_INTERVAL
+                        ),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=10)),
+                    vol.Required(
+                        CONF_IDLE_POLL_INTERVAL,
+                        default=self.options.get(
+                            CONF_IDLE_POLL_INTERVAL, DEFAULT_IDLE_POLL_INTERVAL
+                        ),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=1)),
+                    vol.Required(
+                        CONF_FIRST_REFRESH_TIMEOUT,
+                        default=self.options.get(
+                            CONF_FIRST_REFRESH_TIMEOUT, DEFAULT_FIRST_REFRESH_TIMEOUT
+                        ),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=1)),
                 }
             ),
         )
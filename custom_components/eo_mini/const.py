@@ -1,4 +1,5 @@
 """Constants for EO."""
+
 # Base component constants
 NAME = "EO Mini"
 DOMAIN = "eo_mini"
@@ -19,7 +20,14 @@ CONF_ENABLED = "enabled"
 CONF_USERNAME = "username"
 CONF_PASSWORD = "password"
 CONF_POLL_INTERVAL = "poll_interval"
+CONF_CHARGING_POLL_INTERVAL = "charging_poll_interval"
+CONF_IDLE_POLL_INTERVAL = "idle_poll_interval"
+CONF_FIRST_REFRESH_TIMEOUT = "first_refresh_timeout"
 DEFAULT_POLL_INTERVAL = 5  # minutes
+DEFAULT_CHARGING_POLL_INTERVAL = 30  # seconds
+DEFAULT_IDLE_POLL_INTERVAL = 30  # minutes
+DEFAULT_FIRST_REFRESH_TIMEOUT = 10  # seconds
+LIVENESS_PROBE_INTERVAL = 60  # seconds between liveness probes
 
 
 STARTUP_MESSAGE = f"""
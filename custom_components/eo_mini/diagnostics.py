@@ -0,0 +1,49 @@
+"""Diagnostics support for EO Mini."""
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from custom_components.eo_mini import EODataUpdateCoordinator
+
+from .const import CONF_PASSWORD, CONF_USERNAME, DOMAIN
+
+TO_REDACT = {
+    CONF_PASSWORD,
+    CONF_USERNAME,
+    "address",
+    "chargerAddress",
+    "hubAddress",
+    "title",
+}
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> dict:
+    "Return where the time goes when talking to EO, and the latest data."
+    coordinator: EODataUpdateCoordinator = hass.data[DOMAIN][entry.entry_id]
+    return {
+        "entry": async_redact_data(entry.as_dict(), TO_REDACT),
+        "api": coordinator.api.metrics.as_dict(),
+        "circuit": coordinator.api.circuit_breaker.state,
+        "warm_up_ms": (
+            None
+            if coordinator.api.warm_up_time is None
+            else round(coordinator.api.warm_up_time * 1000, 1)
+        ),
+        "refresh": coordinator.refresh_stats.as_dict(),
+        "fetch_timings_ms": {
+            name: round(seconds * 1000, 1)
+            for name, seconds in coordinator.fetch_timings.items()
+        },
+        "update_interval_s": coordinator.update_interval.total_seconds(),
+        "devices": async_redact_data(
+            {
+                serial: device.as_json()
+                for serial, device in coordinator.devices.items()
+            },
+            TO_REDACT,
+        ),
+        "session": coordinator.data.as_json() if coordinator.data else None,
+    }
@@ -1,32 +1,207 @@
 "EOMiniChargerEntity to hold all charger information"
+
+from collections.abc import Callable, Iterable
+import logging
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import callback
+from homeassistant.helpers import entity_registry as er
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
-from homeassistant.helpers.entity import DeviceInfo
+from homeassistant.helpers.entity import DeviceInfo, Entity
+from homeassistant.helpers.entity_platform import AddEntitiesCallback
 
-from custom_components.eo_mini import EODataUpdateCoordinator
+from custom_components.eo_mini import EODataUpdateCoordinator, eo_model
 
 from .const import DOMAIN
+from .models import EOChargerSnapshot, EOMini, EOSession
+
+_LOGGER: logging.Logger = logging.getLogger(__package__)
+
+# What entities see of a device missing from the latest poll
+NO_SNAPSHOT = EOChargerSnapshot(None, None, False)
+
+# The unique ID suffixes of the session entities, longest first so that none is
+# mistaken for the end of another
+SESSION_UNIQUE_ID_SUFFIXES = (
+    "_vehicle_connected",
+    "_lifetime_energy",
+    "_charging_time",
+    "_energy",
+)
+
+
+@callback
+def async_migrate_session_entities(
+    entry: ConfigEntry, coordinator: EODataUpdateCoordinator
+) -> None:
+    """
+    Move the session entities to the device that shows the session now.
+
+    Which device that is depends on how many chargers the account has, see
+    EODataUpdateCoordinator.session_serial. When that changes the registered
+    entities are given the unique IDs they have under the other device, so they
+    keep their entity IDs and history rather than being orphaned.
+    """
+    registry = er.async_get(coordinator.hass)
+    account_prefix = f"{DOMAIN}_account_{entry.entry_id}_"
+    charger_prefix = f"{DOMAIN}_charger_"
+    session_serial = coordinator.session_serial
+
+    for entity in er.async_entries_for_config_entry(registry, entry.entry_id):
+        unique_id = entity.unique_id
+        suffix = next(
+            (s for s in SESSION_UNIQUE_ID_SUFFIXES if unique_id.endswith(s)), None
+        )
+        if suffix is None:
+            continue
+
+        if session_serial is not None and unique_id.startswith(account_prefix):
+            new_unique_id = f"{charger_prefix}{session_serial}{suffix}"
+        elif session_serial is None and unique_id.startswith(charger_prefix):
+            new_unique_id = f"{account_prefix[:-1]}{suffix}"
+        else:
+            continue
+
+        if registry.async_get_entity_id(entity.domain, entity.platform, new_unique_id):
+            _LOGGER.warning(
+                "Not moving %s, %s is already registered",
+                entity.entity_id,
+                new_unique_id,
+            )
+            continue
+        registry.async_update_entity(entity.entity_id, new_unique_id=new_unique_id)
+
+
+@callback
+def async_add_charger_entities(
+    entry: ConfigEntry,
+    coordinator: EODataUpdateCoordinator,
+    async_add_entities: AddEntitiesCallback,
+    build: Callable[[], Iterable[Entity]],
+) -> None:
+    """
+    Add a platform's entities for the account's chargers once they're known.
+
+    They are known at setup when the charger list was cached or the first refresh
+    finished in time; otherwise the entities are added after the first refresh
+    that finds them. The session entities are moved to their device first.
+    """
+    if coordinator.devices:
+        async_migrate_session_entities(entry, coordinator)
+        async_add_entities(build())
+        return
+
+    remove_listener = None
+
+    @callback
+    def _async_check_devices() -> None:
+        nonlocal remove_listener
+        if coordinator.devices and remove_listener:
+            remove_listener()
+            remove_listener = None
+            async_migrate_session_entities(entry, coordinator)
+            async_add_entities(build())
+
+    @callback
+    def _async_stop_listening() -> None:
+        if remove_listener:
+            remove_listener()
+
+    # Listening also keeps the coordinator polling until the chargers are found.
+    remove_listener = coordinator.async_add_listener(_async_check_devices)
+    entry.async_on_unload(_async_stop_listening)
 
 
 class EOMiniChargerEntity(CoordinatorEntity):
-    "Base type for entities for the charger device"
+    """
+    Base type for entities for the charger device.
+
+    Session entities on accounts with more than one charger are created with a
+    serial of None and belong to a device for the account instead, see
+    EODataUpdateCoordinator.session_serial.
+    """
+
+    coordinator: EODataUpdateCoordinator
+
+    _last_written = None
+
+    # Fields of the charger's data this entity reads, see
+    # EODataUpdateCoordinator.changed_fields. Entities that don't list any are
+    # updated on every refresh.
+    _watched_fields: tuple[str, ...] = ()
+
+    def __init__(self, coordinator: EODataUpdateCoordinator, serial: str | None):
+        super().__init__(
+            coordinator,
+            context=(
+                frozenset((serial, field) for field in self._watched_fields)
+                if self._watched_fields
+                else None
+            ),
+        )
+        self.serial = serial
+        self.model = eo_model(serial) if serial else "EO Account"
+
+    @callback
+    def _async_write_if_changed(self) -> None:
+        """
+        Write the state to Home Assistant only if it differs from the last write.
+
+        Most polls return the same values as the one before, and writing them again
+        would still fire a state event and a recorder write.
+        """
+        written = (
+            self.available,
+            self.state,
+            self.state_attributes,
+            self.extra_state_attributes,
+        )
+        if written == self._last_written:
+            return
 
-    def __init__(self, coordinator: EODataUpdateCoordinator):
-        super().__init__(coordinator)
+        self._last_written = written
+        self.async_write_ha_state()
 
     async def async_added_to_hass(self) -> None:
         """When entity is added to hass."""
         await super().async_added_to_hass()
         self._handle_coordinator_update()
 
+    @property
+    def snapshot(self) -> EOChargerSnapshot:
+        "The device's state from the latest poll"
+        return self.coordinator.snapshots.get(self.serial, NO_SNAPSHOT)
+
+    @property
+    def device(self) -> EOMini | None:
+        "The charger's entry from the /api/mini/list payload"
+        return self.snapshot.charger
+
+    @property
+    def session(self) -> EOSession | None:
+        "The current session, if it is shown on this device"
+        return self.snapshot.session
+
     @property
     def device_unique_id(self):
         """Return a unique ID to use for this entity."""
-        return f"{DOMAIN}_{self.coordinator.serial}"
+        if self.serial is None:
+            return f"{DOMAIN}_account_{self.coordinator.config_entry.entry_id}"
+        return f"{DOMAIN}_{self.serial}"
+
+    @property
+    def unique_id_prefix(self):
+        "Return the prefix for the unique IDs of the device's entities"
+        if self.serial is None:
+            return f"{DOMAIN}_account_{self.coordinator.config_entry.entry_id}"
+        return f"{DOMAIN}_charger_{self.serial}"
 
     @property
     def device_name(self):
         "Return the name of the device"
-        return f"{self.coordinator.model} - {self.coordinator.serial}"
+        if self.serial is None:
+            return self.model
+        return f"{self.model} - {self.serial}"
 
     @property
     def name(self):
@@ -38,7 +213,7 @@ class EOMiniChargerEntity(CoordinatorEntity):
         return DeviceInfo(
             identifiers={(DOMAIN, self.device_unique_id)},
             name=self.device_name,
-            model=self.coordinator.model,
+            model=self.model,
             manufacturer="EO",
         )
 
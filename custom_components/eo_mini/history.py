@@ -0,0 +1,144 @@
+"Import EO's charging session history into Home Assistant's long-term statistics"
+
+import asyncio
+from datetime import datetime, timezone
+import logging
+
+from homeassistant.components.recorder.models import StatisticData, StatisticMetaData
+from homeassistant.components.recorder.statistics import async_add_external_statistics
+from homeassistant.const import UnitOfEnergy, UnitOfTime
+from homeassistant.core import HomeAssistant
+
+from .api import EOApiClient
+from .const import DOMAIN
+from .models import EOSession
+from .storage import EOAccountCache
+
+_LOGGER: logging.Logger = logging.getLogger(__package__)
+
+PAGE_INTERVAL = 1.0  # seconds between pages, leaving the API to the coordinator
+
+# Where the import got to, saved in the account cache after each page
+EMPTY_CHECKPOINT = {
+    "page": 0,
+    "last_pi_time": None,
+    "energy_sum": 0.0,  # kWh before the open hour
+    "time_sum": 0,  # seconds before the open hour
+    "hour": None,  # the last hour with sessions, epoch seconds
+    "hour_energy": 0.0,
+    "hour_time": 0,
+}
+
+
+class EOHistoryImporter:
+    """
+    Write hourly charging energy and time statistics from EO's session history.
+
+    EO only says when a session started, so each session's energy and charging
+    time count towards the hour it started in. Pages are imported oldest first,
+    one batch of statistics per page, and a checkpoint saved after each page
+    lets the import carry on where it left off after a restart. Re-importing an
+    hour overwrites it, so replaying a page after a crash is harmless.
+
+    Pages are streamed from EOApiClient.async_iter_session_history and spaced
+    out by page_interval, so a long history is backfilled in the background in
+    bounded memory without crowding out the coordinator's polls.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        client: EOApiClient,
+        cache: EOAccountCache,
+        entry_id: str,
+    ) -> None:
+        "Initialise."
+        self.hass = hass
+        self.client = client
+        self.cache = cache
+        self.page_interval = PAGE_INTERVAL
+        object_id = entry_id.lower()
+        self.energy_metadata = StatisticMetaData(
+            has_mean=False,
+            has_sum=True,
+            name="EO charging energy",
+            source=DOMAIN,
+            statistic_id=f"{DOMAIN}:energy_{object_id}",
+            unit_of_measurement=UnitOfEnergy.KILO_WATT_HOUR,
+        )
+        self.time_metadata = StatisticMetaData(
+            has_mean=False,
+            has_sum=True,
+            name="EO charging time",
+            source=DOMAIN,
+            statistic_id=f"{DOMAIN}:charging_time_{object_id}",
+            unit_of_measurement=UnitOfTime.SECONDS,
+        )
+
+    async def async_import(self) -> int:
+        "Import the sessions added since the last checkpoint, returning how many"
+        checkpoint = {**EMPTY_CHECKPOINT, **(self.cache.get("history") or {})}
+        imported = 0
+
+        async for page, sessions in self.client.async_iter_session_history(
+            checkpoint["page"]
+        ):
+            new = [
+                session
+                for session in sessions
+                if checkpoint["last_pi_time"] is None
+                or session.pi_time > checkpoint["last_pi_time"]
+            ]
+            if new:
+                energy, charging_time = self._add_sessions(checkpoint, new)
+                async_add_external_statistics(self.hass, self.energy_metadata, energy)
+                async_add_external_statistics(
+                    self.hass, self.time_metadata, charging_time
+                )
+                imported += len(new)
+
+            # The last page may still grow, so it is read again next time.
+            if len(sessions) >= self.client.history_page_size:
+                page += 1
+            checkpoint["page"] = page
+            self.cache.async_update(history=dict(checkpoint))
+            await asyncio.sleep(self.page_interval)
+
+        _LOGGER.debug("Imported %d sessions from EO's history", imported)
+        return imported
+
+    @staticmethod
+    def _add_sessions(
+        checkpoint: dict, sessions: list[EOSession]
+    ) -> tuple[list[StatisticData], list[StatisticData]]:
+        "Add sessions to the checkpoint's totals, returning the hours they changed"
+        energy = {}
+        charging_time = {}
+
+        for session in sorted(sessions, key=lambda session: session.pi_time):
+            hour = session.pi_time - session.pi_time % 3600
+            if hour != checkpoint["hour"]:
+                # Close the open hour, its totals are now part of the sums.
+                checkpoint["energy_sum"] += checkpoint["hour_energy"]
+                checkpoint["time_sum"] += checkpoint["hour_time"]
+                checkpoint["hour"] = hour
+                checkpoint["hour_energy"] = 0.0
+                checkpoint["hour_time"] = 0
+
+            checkpoint["hour_energy"] += session.energy / 1000
+            checkpoint["hour_time"] += session.charging_time
+            checkpoint["last_pi_time"] = session.pi_time
+
+            start = datetime.fromtimestamp(hour, timezone.utc)
+            energy[hour] = StatisticData(
+                start=start,
+                state=checkpoint["hour_energy"],
+                sum=checkpoint["energy_sum"] + checkpoint["hour_energy"],
+            )
+            charging_time[hour] = StatisticData(
+                start=start,
+                state=checkpoint["hour_time"],
+                sum=checkpoint["time_sum"] + checkpoint["hour_time"],
+            )
+
+        return list(energy.values()), list(charging_time.values())
@@ -0,0 +1,122 @@
+"In-process metrics for the EO API client and coordinator"
+
+from collections import Counter, deque
+
+LATENCY_SAMPLES = 256  # most recent samples kept for percentiles
+
+
+class EOLatencyStats:
+    "How many times something happened and how long the recent ones took"
+
+    def __init__(self) -> None:
+        "Initialise."
+        self.count = 0
+        self.last = None
+        self._samples = deque(maxlen=LATENCY_SAMPLES)
+
+    def record(self, seconds: float) -> None:
+        "Record one occurrence that took the given time"
+        self.count += 1
+        self.last = seconds
+        self._samples.append(seconds)
+
+    def percentile(self, percent: float) -> float | None:
+        "The given percentile of the recent samples, in seconds"
+        if not self._samples:
+            return None
+        samples = sorted(self._samples)
+        return samples[round(percent / 100 * (len(samples) - 1))]
+
+    def as_dict(self) -> dict:
+        "Summarise the stats, with times in milliseconds"
+        return {
+            "count": self.count,
+            "last_ms": _ms(self.last),
+            "p50_ms": _ms(self.percentile(50)),
+            "p95_ms": _ms(self.percentile(95)),
+            "p99_ms": _ms(self.percentile(99)),
+        }
+
+
+class EOEndpointStats(EOLatencyStats):
+    "Requests to one endpoint, with their failures and response sizes"
+
+    def __init__(self) -> None:
+        "Initialise."
+        super().__init__()
+        self.errors = Counter()
+        self.bytes = 0
+
+    def as_dict(self) -> dict:
+        "Summarise the stats, with times in milliseconds"
+        return {**super().as_dict(), "errors": dict(self.errors), "bytes": self.bytes}
+
+
+class EOMetrics:
+    "Metrics for every request made by one EOApiClient, by endpoint"
+
+    def __init__(self) -> None:
+        "Initialise."
+        self.endpoints: dict[str, EOEndpointStats] = {}
+        self.reauths = 0
+        self.retries = 0
+        self.coalesced = 0  # calls that shared another call's request
+        self.cache_hits = 0  # responses reused without decoding
+        # Requests over a connection that was already open, and ones that opened one
+        self.connections = {"warm": EOLatencyStats(), "cold": EOLatencyStats()}
+
+    def record(
+        self,
+        endpoint: str,
+        status: int | str,
+        seconds: float,
+        size: int,
+        connection: str | None = None,
+    ):
+        """
+        Record a completed request.
+
+        Anything but a 200 or 304 counts as an error under its status, or for
+        requests that didn't get a response, the name of the exception.
+        connection is "warm" or "cold" if it's known, see EORequestConnection.
+        """
+        if (stats := self.endpoints.get(endpoint)) is None:
+            stats = self.endpoints[endpoint] = EOEndpointStats()
+        stats.record(seconds)
+        stats.bytes += size
+        if status not in (200, 304):
+            stats.errors[status] += 1
+        if connection is not None:
+            self.connections[connection].record(seconds)
+
+    @property
+    def requests(self) -> int:
+        "Requests made to all endpoints"
+        return sum(stats.count for stats in self.endpoints.values())
+
+    @property
+    def errors(self) -> int:
+        "Failed requests to all endpoints"
+        return sum(stats.errors.total() for stats in self.endpoints.values())
+
+    def as_dict(self) -> dict:
+        "Summarise the metrics for diagnostics"
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "reauths": self.reauths,
+            "retries": self.retries,
+            "coalesced": self.coalesced,
+            "cache_hits": self.cache_hits,
+            "connections": {
+                name: stats.as_dict() for name, stats in self.connections.items()
+            },
+            "endpoints": {
+                endpoint: stats.as_dict() for endpoint, stats in self.endpoints.items()
+            },
+        }
+
+
+def _ms(seconds: float | None) -> float | None:
+    "Convert seconds to milliseconds, rounded for display"
+    return None if seconds is None else round(seconds * 1000, 1)
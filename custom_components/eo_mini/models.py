@@ -0,0 +1,83 @@
+"Compact records for the EO API payloads the integration uses"
+
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+
+
+@dataclass(frozen=True, slots=True)
+class EOMini:
+    "A charger from /api/mini/list, keeping only the fields the integration reads"
+
+    hub_serial: str
+    address: str
+    is_disabled: bool
+
+    @classmethod
+    def from_json(cls, json: dict) -> "EOMini":
+        "Build from one entry of the /api/mini/list payload"
+        return cls(json["hubSerial"], json["address"], bool(json.get("isDisabled")))
+
+    @classmethod
+    def from_json_list(cls, json: list[dict]) -> list["EOMini"]:
+        "Build from the whole /api/mini/list payload"
+        return [cls.from_json(mini) for mini in json]
+
+    def as_json(self) -> dict:
+        "The fields kept, as EO names them, e.g. for storage"
+        return {
+            "hubSerial": self.hub_serial,
+            "address": self.address,
+            "isDisabled": int(self.is_disabled),
+        }
+
+
+@dataclass(frozen=True, slots=True)
+class EOSession:
+    "The session from /api/session, keeping only the fields the integration reads"
+
+    pi_time: int  # when the vehicle was plugged in, epoch seconds
+    eskwh: int  # energy delivered, in watt-seconds despite the name
+    charging_time: int  # seconds spent charging
+
+    # Derived once here rather than by every entity on every update.
+    energy: float = field(init=False)  # watt-hours
+    started: datetime = field(init=False)
+
+    def __post_init__(self) -> None:
+        object.__setattr__(self, "energy", self.eskwh / 3600)
+        object.__setattr__(
+            self, "started", datetime.fromtimestamp(self.pi_time, timezone.utc)
+        )
+
+    @classmethod
+    def from_json(cls, json: dict) -> "EOSession":
+        "Build from the /api/session payload"
+        return cls(json["PiTime"], json.get("ESKWH", 0), json.get("ChargingTime", 0))
+
+    @classmethod
+    def from_json_list(cls, json: list[dict]) -> list["EOSession"]:
+        "Build from a page of the session history"
+        return [cls.from_json(session) for session in json]
+
+    def as_json(self) -> dict:
+        "The fields kept, as EO names them, e.g. for diagnostics"
+        return {
+            "PiTime": self.pi_time,
+            "ESKWH": self.eskwh,
+            "ChargingTime": self.charging_time,
+        }
+
+
+@dataclass(frozen=True, slots=True)
+class EOChargerSnapshot:
+    """
+    Everything one device's entities show, built once per poll.
+
+    charger is None for the account-level session entities, see
+    EODataUpdateCoordinator.session_serial, and session is None unless the
+    session is shown on this device.
+    """
+
+    charger: EOMini | None
+    session: EOSession | None
+    vehicle_connected: bool
@@ -0,0 +1,55 @@
+"API clients shared by everything that uses the same EO account"
+
+from homeassistant.const import EVENT_HOMEASSISTANT_CLOSE
+from homeassistant.core import Event, HomeAssistant, callback
+from homeassistant.util.ssl import get_default_context
+
+from .api import EOApiClient
+from .const import DOMAIN
+from .tracing import eo_trace_config
+from .transport import EOAiohttpTransport
+
+DATA_CLIENTS = "clients"
+DATA_CLOSE_LISTENERS = "close_listeners"  # unsubscribe callbacks, by account
+
+
+@callback
+def async_get_client(hass: HomeAssistant, username: str, password: str) -> EOApiClient:
+    """
+    Get the client for an account, creating it the first time the account is used.
+
+    The config flow, entry setup and reloads all go through here, so the bearer
+    token and the connection pool are reused instead of logging in again. Each
+    account gets its own connection pool, tuned for EO and closed when Home
+    Assistant stops, and request tracing only applies to EO requests.
+    """
+    data = hass.data.setdefault(DOMAIN, {})
+    clients = data.setdefault(DATA_CLIENTS, {})
+    close_listeners = data.setdefault(DATA_CLOSE_LISTENERS, {})
+    if (client := clients.get(username)) is None:
+        transport = EOAiohttpTransport.create(
+            get_default_context(), trace_configs=[eo_trace_config()]
+        )
+        client = clients[username] = EOApiClient(username, password, transport)
+
+        async def _async_close(_event: Event) -> None:
+            close_listeners.pop(username, None)
+            await client.async_close()
+
+        close_listeners[username] = hass.bus.async_listen_once(
+            EVENT_HOMEASSISTANT_CLOSE, _async_close
+        )
+    else:
+        client.update_password(password)
+
+    return client
+
+
+@callback
+def async_forget_client(hass: HomeAssistant, username: str) -> None:
+    "Drop the client for an account, e.g. when its credentials were rejected"
+    data = hass.data.get(DOMAIN, {})
+    if remove_listener := data.get(DATA_CLOSE_LISTENERS, {}).pop(username, None):
+        remove_listener()
+    if client := data.get(DATA_CLIENTS, {}).pop(username, None):
+        hass.async_create_task(client.async_close())
@@ -0,0 +1,144 @@
+"Rate limiting, retries and circuit breaking for requests to the EO cloud"
+
+import asyncio
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+import random
+import time
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+
+
+class EOCircuitOpenError(Exception):
+    "Exception for requests refused because the EO cloud is failing"
+
+    def __init__(self, retry_in: float):
+        super().__init__(self)
+        self.retry_in = retry_in
+
+    def __str__(self):
+        return f"EO API unavailable, not retrying for {self.retry_in:.0f}s"
+
+
+@dataclass
+class EORetryPolicy:
+    """
+    How to retry idempotent requests that failed in a way that might not last.
+
+    Delays grow exponentially from base_delay with full jitter, so clients that
+    failed together don't retry together. A Retry-After header is honoured, unless
+    it asks for longer than max_delay, in which case the request isn't retried.
+    """
+
+    attempts: int = 3
+    base_delay: float = 0.5
+    max_delay: float = 8.0
+    statuses: frozenset[int] = frozenset({429, 500, 502, 503, 504})
+
+    def delay(self, attempt: int, retry_after: str | None = None) -> float | None:
+        "Seconds to wait before retrying after the given failed attempt, or None"
+        if attempt + 1 >= self.attempts:
+            return None
+
+        if retry_after is not None:
+            wait = _parse_retry_after(retry_after)
+            if wait is not None:
+                return wait if wait <= self.max_delay else None
+
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+
+class EOCircuitBreaker:
+    """
+    Fail fast while the EO cloud is down instead of waiting for every timeout.
+
+    After failure_threshold consecutive failures the circuit opens and requests are
+    refused for reset_timeout seconds. Then a single probe request is let through
+    (half open): if it succeeds the circuit closes, otherwise it opens again.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 60.0):
+        "Initialise."
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CIRCUIT_CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_started = None
+
+    def before_request(self) -> None:
+        "Raise EOCircuitOpenError if a request shouldn't be made now"
+        now = time.monotonic()
+        if self.state == CIRCUIT_OPEN:
+            retry_in = self._opened_at + self.reset_timeout - now
+            if retry_in > 0:
+                raise EOCircuitOpenError(retry_in)
+            self.state = CIRCUIT_HALF_OPEN
+
+        if self.state == CIRCUIT_HALF_OPEN:
+            # Only one probe at a time, unless the last one never reported back.
+            if (
+                self._probe_started is not None
+                and now - self._probe_started < self.reset_timeout
+            ):
+                raise EOCircuitOpenError(self._probe_started + self.reset_timeout - now)
+            self._probe_started = now
+
+    def record_success(self) -> None:
+        "Note that a request got a usable response"
+        self.state = CIRCUIT_CLOSED
+        self._failures = 0
+        self._probe_started = None
+
+    def record_failure(self) -> None:
+        "Note that a request failed in a way that suggests the cloud is unhealthy"
+        self._failures += 1
+        self._probe_started = None
+        if self.state == CIRCUIT_HALF_OPEN or self._failures >= self.failure_threshold:
+            self.state = CIRCUIT_OPEN
+            self._opened_at = time.monotonic()
+
+
+class EORateLimiter:
+    """
+    Token bucket limiting how fast one account's requests are sent.
+
+    Bursts of up to burst requests go straight through, after which requests are
+    spaced out to rate per second, in the order they arrived.
+    """
+
+    def __init__(self, rate: float = 1.0, burst: int = 10):
+        "Initialise."
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def async_acquire(self) -> None:
+        "Wait until a request may be sent"
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.burst, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def _parse_retry_after(value: str) -> float | None:
+    "Seconds to wait from a Retry-After header, given as seconds or an HTTP date"
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,95 @@
+"Adaptive polling for the EO Mini coordinator"
+
+from datetime import timedelta
+from time import monotonic
+
+from homeassistant.core import callback
+
+from .models import EOSession
+
+LOCK_TOGGLE_FAST_WINDOW = 120  # seconds to poll quickly after the lock is toggled
+FULL_FETCH_SLACK = 2  # seconds early a scheduled refresh may fire
+
+
+class EOPollScheduler:
+    """
+    Choose how long to wait before the next poll from what the charger is doing.
+
+    Poll quickly while energy is being delivered, when a vehicle has just been
+    plugged in or unplugged, and for a short while after the lock is toggled;
+    at the normal interval while a vehicle is connected but not charging; and
+    slowly when nothing is plugged in.
+
+    With a probe interval, refreshes in between those full polls only probe
+    whether a vehicle is connected, see EODataUpdateCoordinator. The intervals
+    returned are capped at the probe interval, and full_fetch_due says whether
+    the state's interval has passed since the last full poll.
+    """
+
+    def __init__(
+        self,
+        charging: timedelta,
+        connected: timedelta,
+        idle: timedelta,
+        probe: timedelta | None = None,
+    ) -> None:
+        "Initialise with the intervals to use in each state."
+        self.charging = charging
+        self.connected = connected
+        self.idle = idle
+        self.probe = probe
+        self._last_eskwh = None
+        self._last_live_session = None
+        self._fast_until = 0.0
+        self._full_due = 0.0
+
+    @callback
+    def note_lock_toggle(self) -> None:
+        "Poll quickly for a while so the lock state is confirmed promptly"
+        self._fast_until = monotonic() + LOCK_TOGGLE_FAST_WINDOW
+
+    @property
+    def fast_polling(self) -> bool:
+        "Whether a recent lock toggle calls for polling quickly"
+        return monotonic() < self._fast_until
+
+    @property
+    def full_fetch_due(self) -> bool:
+        "Whether the next refresh should fetch everything rather than probe"
+        return (
+            self.probe is None
+            or self.fast_polling
+            or monotonic() + FULL_FETCH_SLACK >= self._full_due
+        )
+
+    @callback
+    def next_interval(self, live_session: bool, session: EOSession | None) -> timedelta:
+        "Work out the interval to the next poll from the latest full poll's data"
+        interval = self._state_interval(live_session, session)
+        self._full_due = monotonic() + interval.total_seconds()
+        if self.probe is not None:
+            return min(interval, self.probe)
+        return interval
+
+    def _state_interval(
+        self, live_session: bool, session: EOSession | None
+    ) -> timedelta:
+        "The interval to the next full poll for what the charger is doing"
+        eskwh = session.eskwh if session else None
+        rising = (
+            eskwh is not None
+            and self._last_eskwh is not None
+            and eskwh > self._last_eskwh
+        )
+        plugged_changed = (
+            self._last_live_session is not None
+            and live_session != self._last_live_session
+        )
+        self._last_eskwh = eskwh
+        self._last_live_session = live_session
+
+        if rising or plugged_changed or self.fast_polling:
+            return self.charging
+        if live_session:
+            return self.connected
+        return self.idle
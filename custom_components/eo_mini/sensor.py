@@ -1,39 +1,50 @@
 """Sensor platform for EO Mini."""
 
-from datetime import datetime
 from homeassistant.components.sensor import (
+    RestoreSensor,
     SensorEntity,
     SensorEntityDescription,
     SensorStateClass,
     SensorDeviceClass,
 )
 
-from homeassistant.const import UnitOfTime, UnitOfEnergy
+from homeassistant.const import EntityCategory, UnitOfTime, UnitOfEnergy
 from homeassistant.core import callback
+from homeassistant.util import dt as dt_util
 
 from custom_components.eo_mini import EODataUpdateCoordinator
 
 from .const import DOMAIN
-from .entity import EOMiniChargerEntity
+from .entity import EOMiniChargerEntity, async_add_charger_entities
 
 
 async def async_setup_entry(hass, entry, async_add_devices):
     "Setup sensor platform."
     coordinator: EODataUpdateCoordinator = hass.data[DOMAIN][entry.entry_id]
-    async_add_devices(
-        [
-            EOMiniChargerSessionEnergySensor(coordinator),
-            EOMiniChargerSessionChargingTimeSensor(coordinator),
+
+    def build():
+        # The metrics cover the whole account, so only the first charger has them.
+        serial = next(iter(coordinator.devices))
+        return [
+            EOMiniChargerSessionEnergySensor(coordinator, coordinator.session_serial),
+            EOMiniChargerSessionChargingTimeSensor(
+                coordinator, coordinator.session_serial
+            ),
+            EOMiniChargerLifetimeEnergySensor(coordinator, coordinator.session_serial),
+            EOMiniRefreshDurationSensor(coordinator, serial),
+            EOMiniApiRequestsSensor(coordinator, serial),
         ]
-    )
+
+    async_add_charger_entities(entry, coordinator, async_add_devices, build)
 
 
-class EOMiniChargerSessionEnergySensor(EOMiniChargerEntity, SensorEntity):
+class EOMiniChargerSessionEnergySensor(EOMiniChargerEntity, RestoreSensor):
     """EO Mini Charger session energy usage sensor class."""
 
     coordinator: EODataUpdateCoordinator
 
     _attr_icon = "mdi:ev-station"
+    _watched_fields = ("pi_time", "eskwh")
 
     def __init__(self, *args):
         self.entity_description = SensorEntityDescription(
@@ -45,32 +56,83 @@ class EOMiniChargerSessionEnergySensor(EOMiniChargerEntity, SensorEntity):
         )
         super().__init__(*args)
 
+    async def async_added_to_hass(self) -> None:
+        "Show the last session's consumption until EO is polled"
+        if (last := await self.async_get_last_sensor_data()) is not None:
+            self._attr_native_value = last.native_value
+        if (last_state := await self.async_get_last_state()) is not None and (
+            last_reset := last_state.attributes.get("last_reset")
+        ):
+            self._attr_last_reset = dt_util.parse_datetime(last_reset)
+        await super().async_added_to_hass()
+
     @callback
     def _handle_coordinator_update(self) -> None:
         "Handle updated data from the coordinator."
-        if self.coordinator.data:
-            if self.coordinator.data["ESKWH"] == 0:
-                self._attr_last_reset = datetime.fromtimestamp(
-                    self.coordinator.data["PiTime"]
-                )
+        if session := self.session:
+            if session.eskwh == 0:
+                self._attr_last_reset = session.started
                 self._attr_native_value = 0
             else:
-                # No idea why ESKWH is stored in KWh/s...
-                self._attr_native_value = self.coordinator.data["ESKWH"] / 3600
-        self.async_write_ha_state()
+                self._attr_native_value = session.energy
+        self._async_write_if_changed()
 
     @property
     def unique_id(self):
         "Return a unique ID to use for this entity."
-        return f"{DOMAIN}_charger_{self.coordinator.serial}_energy"
+        return f"{self.unique_id_prefix}_energy"
+
+
+class EOMiniChargerLifetimeEnergySensor(EOMiniChargerEntity, RestoreSensor):
+    """
+    EO Mini Charger lifetime energy usage sensor class.
+
+    Unlike the session sensor this never resets, so the Energy dashboard can use
+    it directly. It counts from when the integration was set up, see
+    EODataUpdateCoordinator.lifetime.
+    """
+
+    coordinator: EODataUpdateCoordinator
+
+    _attr_icon = "mdi:ev-station"
+    _watched_fields = ("lifetime_energy",)
+
+    def __init__(self, *args):
+        self.entity_description = SensorEntityDescription(
+            key="lifetime_energy",
+            native_unit_of_measurement=UnitOfEnergy.WATT_HOUR,
+            device_class=SensorDeviceClass.ENERGY,
+            state_class=SensorStateClass.TOTAL_INCREASING,
+            name="Lifetime Consumption",
+        )
+        super().__init__(*args)
 
+    async def async_added_to_hass(self) -> None:
+        "Keep counting from the restored total if the cache lost it"
+        last = await self.async_get_last_sensor_data()
+        if last is not None and last.native_value is not None:
+            self.coordinator.async_restore_lifetime(float(last.native_value))
+        await super().async_added_to_hass()
 
-class EOMiniChargerSessionChargingTimeSensor(EOMiniChargerEntity, SensorEntity):
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        "Handle updated data from the coordinator."
+        self._attr_native_value = self.coordinator.lifetime["total"]
+        self._async_write_if_changed()
+
+    @property
+    def unique_id(self):
+        "Return a unique ID to use for this entity."
+        return f"{self.unique_id_prefix}_lifetime_energy"
+
+
+class EOMiniChargerSessionChargingTimeSensor(EOMiniChargerEntity, RestoreSensor):
     """EO Mini Charger session charging time sensor class."""
 
     coordinator: EODataUpdateCoordinator
 
     _attr_icon = "mdi:ev-station"
+    _watched_fields = ("eskwh", "charging_time")
 
     def __init__(self, *args):
         self.entity_description = SensorEntityDescription(
@@ -83,18 +145,108 @@ class EOMiniChargerSessionChargingTimeSensor(EOMiniChargerEntity, SensorEntity):
         self._attr_native_value = 0
         super().__init__(*args)
 
+    async def async_added_to_hass(self) -> None:
+        "Show the last session's charging time until EO is polled"
+        if (last := await self.async_get_last_sensor_data()) is not None:
+            self._attr_native_value = last.native_value
+        await super().async_added_to_hass()
+
     @callback
     def _handle_coordinator_update(self) -> None:
         "Handle updated data from the coordinator."
 
-        if self.coordinator.data:
-            if self.coordinator.data["ESKWH"] == 0:
+        if session := self.session:
+            if session.eskwh == 0:
                 self._attr_native_value = 0
             else:
-                self._attr_native_value = self.coordinator.data["ChargingTime"]
-        self.async_write_ha_state()
+                self._attr_native_value = session.charging_time
+        self._async_write_if_changed()
+
+    @property
+    def unique_id(self):
+        "Return a unique ID to use for this entity."
+        return f"{self.unique_id_prefix}_charging_time"
+
+
+class EOMiniRefreshDurationSensor(EOMiniChargerEntity, SensorEntity):
+    """Diagnostic sensor for how long refreshing the data from EO takes."""
+
+    coordinator: EODataUpdateCoordinator
+
+    _attr_icon = "mdi:timer-outline"
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_entity_registry_enabled_default = False
+
+    def __init__(self, *args):
+        self.entity_description = SensorEntityDescription(
+            key="refresh_duration",
+            native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+            device_class=SensorDeviceClass.DURATION,
+            state_class=SensorStateClass.MEASUREMENT,
+            name="Refresh Duration",
+        )
+        self._attr_extra_state_attributes = {"integration": DOMAIN}
+        super().__init__(*args)
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        "Handle updated data from the coordinator."
+        stats = self.coordinator.refresh_stats.as_dict()
+        self._attr_native_value = stats["last_ms"]
+        self._attr_extra_state_attributes = {
+            "integration": DOMAIN,
+            "p50_ms": stats["p50_ms"],
+            "p95_ms": stats["p95_ms"],
+        }
+        self._async_write_if_changed()
+
+    @property
+    def extra_state_attributes(self):
+        "Return the state attributes."
+        return self._attr_extra_state_attributes
+
+    @property
+    def unique_id(self):
+        "Return a unique ID to use for this entity."
+        return f"{self.unique_id_prefix}_refresh_duration"
+
+
+class EOMiniApiRequestsSensor(EOMiniChargerEntity, SensorEntity):
+    """Diagnostic sensor counting the requests made to the EO API."""
+
+    coordinator: EODataUpdateCoordinator
+
+    _attr_icon = "mdi:api"
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_entity_registry_enabled_default = False
+
+    def __init__(self, *args):
+        self.entity_description = SensorEntityDescription(
+            key="api_requests",
+            state_class=SensorStateClass.TOTAL_INCREASING,
+            name="API Requests",
+        )
+        self._attr_extra_state_attributes = {"integration": DOMAIN}
+        super().__init__(*args)
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        "Handle updated data from the coordinator."
+        metrics = self.coordinator.api.metrics
+        self._attr_native_value = metrics.requests
+        self._attr_extra_state_attributes = {
+            "integration": DOMAIN,
+            "errors": metrics.errors,
+            "reauths": metrics.reauths,
+        }
+        self._async_write_if_changed()
+
+    @property
+    def extra_state_attributes(self):
+        "Return the state attributes."
+        return self._attr_extra_state_attributes
 
     @property
     def unique_id(self):
         "Return a unique ID to use for this entity."
-        return f"{DOMAIN}_charger_{self.coordinator.serial}_charging_time"
+        return f"{self.unique_id_prefix}_api_requests"
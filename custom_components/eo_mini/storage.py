@@ -0,0 +1,46 @@
+"On-disk cache of the account data that rarely changes between restarts"
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+
+from .const import DOMAIN
+
+STORAGE_VERSION = 1
+SAVE_DELAY = 10  # seconds
+
+
+class EOAccountCache:
+    """
+    Cached token, user payload and charger list for one config entry.
+
+    Loading this at startup lets the integration create its entities and make its
+    first requests without logging in or fetching the static account data again.
+    It also holds the history import's checkpoint, see EOHistoryImporter.
+    """
+
+    def __init__(self, hass: HomeAssistant, entry_id: str) -> None:
+        "Initialise."
+        self._store = Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry_id}")
+        self._data = {}
+
+    async def async_load(self) -> dict:
+        "Read the cache from disk"
+        self._data = await self._store.async_load() or {}
+        return self._data
+
+    def get(self, key: str):
+        "A value from the cache, None if it isn't there"
+        return self._data.get(key)
+
+    @callback
+    def async_update(self, **values) -> None:
+        "Merge values into the cache, scheduling a write only if something changed"
+        if all(self._data.get(key) == value for key, value in values.items()):
+            return
+
+        self._data = {**self._data, **values}
+        self._store.async_delay_save(lambda: self._data, SAVE_DELAY)
+
+    async def async_remove(self) -> None:
+        "Delete the cache from disk"
+        await self._store.async_remove()
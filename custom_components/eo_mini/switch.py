@@ -1,4 +1,3 @@
-import asyncio
 import logging
 
 from homeassistant.components.switch import (
@@ -6,29 +5,38 @@ from homeassistant.components.switch import (
     SwitchEntity,
     SwitchEntityDescription,
 )
+from homeassistant.const import STATE_ON
 from homeassistant.core import callback
+from homeassistant.helpers.debounce import Debouncer
+from homeassistant.helpers.restore_state import RestoreEntity
 
 from custom_components.eo_mini import EODataUpdateCoordinator
 
 from .const import DOMAIN
-from .entity import EOMiniChargerEntity
+from .entity import EOMiniChargerEntity, async_add_charger_entities
 
 _LOGGER: logging.Logger = logging.getLogger(__package__)
 
+LOCK_DEBOUNCE = 2  # seconds to wait for further toggles before calling the API
+
 
 async def async_setup_entry(hass, entry, async_add_devices):
     "Setup sensor platform."
     coordinator: EODataUpdateCoordinator = hass.data[DOMAIN][entry.entry_id]
-    async_add_devices(
-        [
-            EOMiniLockSwitch(coordinator),
-        ]
+    async_add_charger_entities(
+        entry,
+        coordinator,
+        async_add_devices,
+        lambda: [
+            EOMiniLockSwitch(coordinator, serial) for serial in coordinator.devices
+        ],
     )
 
 
-class EOMiniLockSwitch(EOMiniChargerEntity, SwitchEntity):
+class EOMiniLockSwitch(EOMiniChargerEntity, SwitchEntity, RestoreEntity):
     "Switch entity to represent the enabled/disabled (locked) status of the charger"
     coordinator: EODataUpdateCoordinator
+    _watched_fields = ("is_disabled",)
 
     def __init__(self, *args):
         self.entity_description = SwitchEntityDescription(
@@ -37,35 +45,88 @@ class EOMiniLockSwitch(EOMiniChargerEntity, SwitchEntity):
             device_class=SwitchDeviceClass.SWITCH,
             icon="mdi:lock",
         )
+        self._pending = None
+        self._debouncer = None
         super().__init__(*args)
 
+    async def async_added_to_hass(self) -> None:
+        """When entity is added to hass."""
+        # Shown until the charger list has an entry for the charger
+        if (last_state := await self.async_get_last_state()) is not None:
+            self._attr_is_on = last_state.state == STATE_ON
+        self._debouncer = Debouncer(
+            self.hass,
+            _LOGGER,
+            cooldown=LOCK_DEBOUNCE,
+            immediate=False,
+            function=self._async_apply_lock,
+        )
+        await super().async_added_to_hass()
+
+    async def async_will_remove_from_hass(self) -> None:
+        """When entity will be removed from hass."""
+        self._debouncer.async_shutdown()
+        await super().async_will_remove_from_hass()
+
     @callback
     def _handle_coordinator_update(self) -> None:
         "Handle updated data from the coordinator."
-        if self.coordinator.device:
+        if self._pending is not None:
+            # Keep showing the requested state until the change has been confirmed.
+            return
+
+        if device := self.device:
             _LOGGER.debug(
                 "update: state: %r, api: %r",
                 self._attr_is_on,
-                bool(self.coordinator.device["isDisabled"]),
+                device.is_disabled,
             )
-            self._attr_is_on = bool(self.coordinator.device["isDisabled"])
-        self.async_write_ha_state()
+            self._attr_is_on = device.is_disabled
+        self._async_write_if_changed()
 
     async def async_turn_on(self, **kwargs):
-        await self.coordinator.api.async_post_disable(
-            self.coordinator.device["address"]
-        )
-
-        # Get the state back from the API
-        await self.coordinator.async_refresh()
+        await self._async_request_lock(True)
 
     async def async_turn_off(self, **kwargs):
-        await self.coordinator.api.async_post_enable(self.coordinator.device["address"])
+        await self._async_request_lock(False)
+
+    async def _async_request_lock(self, locked: bool) -> None:
+        """
+        Show the requested state straight away and send it to EO shortly after.
+
+        Toggles in quick succession are coalesced, so only the final state is sent.
+        """
+        self._pending = locked
+        self._attr_is_on = locked
+        self._async_write_if_changed()
+        self.coordinator.scheduler.note_lock_toggle()
+        await self._debouncer.async_call()
+
+    async def _async_apply_lock(self) -> None:
+        "Send the requested lock state to EO, then confirm it from the charger list"
+        while (locked := self._pending) is not None:
+            try:
+                if self.device and locked != self.device.is_disabled:
+                    address = self.device.address
+                    if locked:
+                        await self.coordinator.api.async_post_disable(address)
+                    else:
+                        await self.coordinator.api.async_post_enable(address)
+
+                # Get the state back from the API
+                await self.coordinator.async_refresh_list()
+            except Exception as ex:  # pylint: disable=broad-except
+                _LOGGER.error("Error setting lock state: %s", str(ex))
+
+            # Go round again if the switch was toggled while the request was in
+            # flight, as the debouncer ignores calls made while this is running.
+            if self._pending == locked:
+                self._pending = None
 
-        # Get the state back from the API
-        await self.coordinator.async_refresh()
+        # Reverts the optimistic state if EO disagrees, or the request failed.
+        self._handle_coordinator_update()
 
     @property
     def unique_id(self):
         "Return a unique ID to use for this entity."
-        return f"{DOMAIN}_charger_{self.coordinator.serial}_locked"
+        return f"{self.unique_id_prefix}_locked"
@@ -0,0 +1,155 @@
+"Request timing for EO API calls, gathered from aiohttp's tracing signals"
+
+from dataclasses import dataclass, field
+from time import monotonic
+
+import aiohttp
+
+
+@dataclass(slots=True)
+class EORequestConnection:
+    """
+    Whether a request reused a connection (warm) or opened one (cold).
+
+    Passed to aiohttp as the request's trace_request_ctx, and set by a callback in
+    eo_trace_config when the request gets its connection. connection stays None
+    if the request wasn't traced, e.g. over an in-memory transport.
+    """
+
+    connection: str | None = field(default=None, kw_only=True)
+
+    def connect_started(self) -> None:
+        "Record that a new connection is being created"
+        self.connection = "cold"
+
+    def connection_reused(self) -> None:
+        "Record that an open connection was reused"
+        self.connection = "warm"
+
+
+@dataclass(slots=True)
+class EORequestTiming(EORequestConnection):
+    """
+    Where the time went in one request, in seconds.
+
+    Used instead of EORequestConnection when the timing will be logged; the other
+    callbacks in eo_trace_config fill it in as the request progresses. aiohttp
+    resolves the host while it creates the connection, so connect is the time
+    spent creating it less the DNS lookup.
+    """
+
+    method: str
+    url: str
+    start: float = field(default_factory=monotonic)
+    dns: float | None = None
+    connect: float | None = None
+    ttfb: float | None = None
+    body: float | None = None
+    total: float | None = None
+    status: int | None = None
+    dns_start: float | None = None
+    connect_start: float | None = None
+
+    def dns_started(self) -> None:
+        "Record that the host lookup has started"
+        self.dns_start = monotonic()
+
+    def dns_ended(self) -> None:
+        "Record that the host lookup has finished"
+        if self.dns_start is not None:
+            self.dns = monotonic() - self.dns_start
+
+    def connect_started(self) -> None:
+        "Record that a new connection is being created"
+        EORequestConnection.connect_started(self)
+        self.connect_start = monotonic()
+
+    def connect_ended(self) -> None:
+        "Record that the new connection is ready"
+        if self.connect_start is not None:
+            self.connect = monotonic() - self.connect_start - (self.dns or 0.0)
+
+    def finish(self) -> None:
+        "Record that the body has been read and the request is complete"
+        now = monotonic()
+        if self.ttfb is not None:
+            self.body = now - self.start - self.ttfb
+        self.total = now - self.start
+
+    def __str__(self) -> str:
+        parts = [f"{self.method.upper()} {self.url}", f"status={self.status}"]
+        for name in ("dns", "connect", "ttfb", "body", "total"):
+            if (value := getattr(self, name)) is not None:
+                parts.append(f"{name}={value * 1000:.1f}ms")
+        if self.connection == "warm":
+            parts.append("reused connection")
+        return " ".join(parts)
+
+
+def _connection(trace_config_ctx) -> EORequestConnection | None:
+    "The connection record for a traced request, if the caller asked for one"
+    ctx = trace_config_ctx.trace_request_ctx
+    return ctx if isinstance(ctx, EORequestConnection) else None
+
+
+def _timing(trace_config_ctx) -> EORequestTiming | None:
+    "The timing record for a traced request, if the caller asked for one"
+    ctx = trace_config_ctx.trace_request_ctx
+    return ctx if isinstance(ctx, EORequestTiming) else None
+
+
+async def _on_dns_start(_session, trace_config_ctx, _params) -> None:
+    if timing := _timing(trace_config_ctx):
+        timing.dns_started()
+
+
+async def _on_dns_end(_session, trace_config_ctx, _params) -> None:
+    if timing := _timing(trace_config_ctx):
+        timing.dns_ended()
+
+
+async def _on_connection_start(_session, trace_config_ctx, _params) -> None:
+    if request := _connection(trace_config_ctx):
+        request.connect_started()
+
+
+async def _on_connection_end(_session, trace_config_ctx, _params) -> None:
+    if timing := _timing(trace_config_ctx):
+        timing.connect_ended()
+
+
+async def _on_connection_reused(_session, trace_config_ctx, _params) -> None:
+    if request := _connection(trace_config_ctx):
+        request.connection_reused()
+
+
+async def _on_request_end(_session, trace_config_ctx, params) -> None:
+    if timing := _timing(trace_config_ctx):
+        timing.ttfb = monotonic() - timing.start
+        timing.status = params.response.status
+
+
+_TRACE_CONFIG = None
+
+
+def eo_trace_config() -> aiohttp.TraceConfig:
+    """
+    The trace config for the EO client sessions, created once and shared.
+
+    It is only attached to the sessions the integration creates for EO, so other
+    requests made by Home Assistant never see it. Requests that only pass an
+    EORequestConnection return from all but the connection callbacks straight
+    away.
+    """
+    global _TRACE_CONFIG  # pylint: disable=global-statement
+    if _TRACE_CONFIG is None:
+        trace = aiohttp.TraceConfig()
+        trace.on_dns_resolvehost_start.append(_on_dns_start)
+        trace.on_dns_resolvehost_end.append(_on_dns_end)
+        trace.on_connection_create_start.append(_on_connection_start)
+        trace.on_connection_create_end.append(_on_connection_end)
+        trace.on_connection_reuseconn.append(_on_connection_reused)
+        trace.on_request_end.append(_on_request_end)
+        trace.freeze()
+        _TRACE_CONFIG = trace
+    return _TRACE_CONFIG
@@ -0,0 +1,174 @@
+"Transports that carry EOApiClient's requests: aiohttp for EO, or scripted in memory"
+
+from abc import ABC, abstractmethod
+import asyncio
+from collections import Counter, deque
+from collections.abc import Callable, Iterable, Mapping
+from dataclasses import dataclass, field
+import json
+import ssl
+import urllib.parse
+
+import aiohttp
+from multidict import CIMultiDict, CIMultiDictProxy
+
+CONNECTION_LIMIT = 10  # connections open to EO at once
+DNS_CACHE_TTL = 300  # seconds to reuse a lookup of EO's host
+KEEPALIVE_TIMEOUT = 75  # seconds to keep an idle connection open, beyond a poll
+
+
+class EOTransport(ABC):
+    """
+    Sends a request and reads the whole response.
+
+    EOApiClient handles everything above that: authorisation, retries, caching,
+    timeouts and metrics.
+    """
+
+    @abstractmethod
+    async def async_request(
+        self, method: str, url: str, **kwargs
+    ) -> tuple[int, Mapping[str, str], bytes]:
+        "Make a request, returning the status, headers and body"
+
+    async def async_warm_up(self, url: str) -> None:
+        "Get ready to make requests to url, e.g. by connecting to its host"
+
+    async def async_close(self) -> None:
+        "Release anything the transport holds open"
+
+
+class EOAiohttpTransport(EOTransport):
+    "Requests over an aiohttp session"
+
+    def __init__(self, session: aiohttp.ClientSession, owned: bool = False) -> None:
+        "Initialise with the session to use, closed with the transport if owned"
+        self.session = session
+        self._owned = owned
+
+    @classmethod
+    def create(
+        cls,
+        ssl_context: ssl.SSLContext | bool = True,
+        trace_configs: list[aiohttp.TraceConfig] | None = None,
+    ) -> "EOAiohttpTransport":
+        """
+        Create a transport with its own connection pool for EO.
+
+        EO is a single host polled every few seconds to minutes, so connections
+        are kept alive between polls and its address is looked up once every
+        DNS_CACHE_TTL rather than for every new connection.
+        """
+        connector = aiohttp.TCPConnector(
+            limit=CONNECTION_LIMIT,
+            limit_per_host=CONNECTION_LIMIT,
+            ttl_dns_cache=DNS_CACHE_TTL,
+            keepalive_timeout=KEEPALIVE_TIMEOUT,
+            ssl=ssl_context,
+        )
+        session = aiohttp.ClientSession(
+            connector=connector, trace_configs=trace_configs
+        )
+        return cls(session, owned=True)
+
+    async def async_request(
+        self, method: str, url: str, **kwargs
+    ) -> tuple[int, Mapping[str, str], bytes]:
+        "Make a request, returning the status, headers and body"
+        async with self.session.request(method, url, **kwargs) as response:
+            return response.status, response.headers, await response.read()
+
+    async def async_warm_up(self, url: str) -> None:
+        """
+        Look up url's host and open a connection to it.
+
+        The connection goes back to the pool for the next request, whatever the
+        response was.
+        """
+        async with self.session.head(url) as response:
+            await response.read()
+
+    async def async_close(self) -> None:
+        "Close the session if the transport created it"
+        if self._owned:
+            await self.session.close()
+
+
+@dataclass(slots=True)
+class EOScriptedResponse:
+    "A response for EOMemoryTransport to give"
+
+    status: int = 200
+    body: bytes = b""
+    headers: Mapping[str, str] = field(default_factory=dict)
+
+    @classmethod
+    def json(
+        cls, data, status: int = 200, headers: Mapping[str, str] | None = None
+    ) -> "EOScriptedResponse":
+        "A response with a JSON body"
+        return cls(
+            status,
+            json.dumps(data).encode(),
+            {aiohttp.hdrs.CONTENT_TYPE: "application/json", **(headers or {})},
+        )
+
+
+# A route's response, an exception to raise, or a function of the method, URL and
+# request kwargs returning either
+EOScript = (
+    EOScriptedResponse
+    | Exception
+    | Callable[[str, str, dict], "EOScriptedResponse | Exception"]
+)
+
+NOT_FOUND = EOScriptedResponse(404, b"Not found")
+
+
+class EOMemoryTransport(EOTransport):
+    """
+    Serve scripted responses from memory, without any network.
+
+    Tests, benchmarks and simulations can run the whole client over it. Routes
+    are keyed by method and path, and responses queued for a route are given
+    once each before its standing response.
+    """
+
+    def __init__(self) -> None:
+        "Initialise with no routes, so every request gets a 404"
+        self.requests: Counter[tuple[str, str]] = Counter()
+        self._routes: dict[tuple[str, str], EOScript] = {}
+        self._queued: dict[tuple[str, str], deque[EOScript]] = {}
+
+    def route(self, method: str, path: str, response: EOScript) -> None:
+        "Answer every request to the route with response"
+        self._routes[(method, path)] = response
+
+    def queue(self, method: str, path: str, responses: Iterable[EOScript]) -> None:
+        "Answer the next requests to the route with responses, in turn"
+        self._queued.setdefault((method, path), deque()).extend(responses)
+
+    async def async_request(
+        self, method: str, url: str, **kwargs
+    ) -> tuple[int, Mapping[str, str], bytes]:
+        "Give the scripted response for the request"
+        key = (method, urllib.parse.urlsplit(url).path)
+        self.requests[key] += 1
+
+        # Give other tasks a turn, as a real request would.
+        await asyncio.sleep(0)
+
+        if queued := self._queued.get(key):
+            response = queued.popleft()
+        else:
+            response = self._routes.get(key, NOT_FOUND)
+        if callable(response):
+            response = response(method, url, kwargs)
+        if isinstance(response, Exception):
+            raise response
+
+        return (
+            response.status,
+            CIMultiDictProxy(CIMultiDict(response.headers)),
+            response.body,
+        )
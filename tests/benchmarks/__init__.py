@@ -0,0 +1 @@
+"""Benchmarks for the EO Mini integration's hot paths."""
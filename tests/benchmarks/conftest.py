@@ -0,0 +1,20 @@
+"""Fixtures for the EO Mini benchmarks."""
+
+import asyncio
+
+import pytest
+
+
+# pytest-benchmark times plain functions, so coroutines are run on Home Assistant's
+# loop from an executor thread, leaving the loop free to run them.
+@pytest.fixture(name="benchmark_async")
+def benchmark_async_fixture(hass, benchmark):
+    """Benchmark a coroutine function on Home Assistant's event loop."""
+
+    async def run(func, *args):
+        def call():
+            return asyncio.run_coroutine_threadsafe(func(*args), hass.loop).result()
+
+        return await hass.async_add_executor_job(benchmark, call)
+
+    return run
@@ -0,0 +1,168 @@
+"""Benchmark the API client, the coordinator's refresh and entity updates.
+
+Run with `pytest tests/benchmarks --benchmark-autosave` to save a baseline, and
+compare later runs against it with `--benchmark-compare`.
+"""
+
+from datetime import timedelta
+import json
+
+from homeassistant.core import HomeAssistant
+import pytest
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+
+from custom_components.eo_mini import EODataUpdateCoordinator
+from custom_components.eo_mini.api import EOApiClient, _parse_json
+from custom_components.eo_mini.const import DOMAIN
+from custom_components.eo_mini.models import EOMini
+from custom_components.eo_mini.resilience import EORateLimiter
+from custom_components.eo_mini.scheduler import EOPollScheduler
+from custom_components.eo_mini.transport import EOMemoryTransport, EOScriptedResponse
+from tests import json_load_file
+from tests.const import MOCK_CONFIG
+from tests.simulator import DEFAULT_PASSWORD, DEFAULT_USERNAME, EOCloudSimulator
+
+CHARGERS = 50  # chargers on the account for the entity benchmark
+LARGE_LIST = 1000  # chargers in the decoded list payload
+
+
+def many_minis(count: int) -> list[dict]:
+    "A /api/mini/list payload with count chargers"
+    mini = json_load_file("list.json")[0]
+    return [
+        {**mini, "address": f"{i:08X}", "hubSerial": f"EM-{i:05d}"}
+        for i in range(count)
+    ]
+
+
+@pytest.fixture(name="api")
+async def charging_api_fixture(api: EOApiClient, simulator: EOCloudSimulator):
+    """A logged in client for the simulator, with a vehicle charging."""
+    simulator.plug_in()
+    simulator.charge(7000)
+    await api.async_get_session()
+    return api
+
+
+@pytest.fixture(name="memory_api")
+async def memory_api_fixture():
+    """A client answered from memory, to time the client without the network."""
+    transport = EOMemoryTransport()
+    transport.route("post", "/token", EOScriptedResponse.json({"access_token": "a"}))
+    for path, payload in (
+        ("/api/user", json_load_file("user.json")),
+        ("/api/mini/list", json_load_file("list.json")),
+        ("/api/session", json_load_file("session_charging.json")),
+        ("/api/session/alive", json_load_file("session_liveness.json")),
+    ):
+        transport.route("get", path, EOScriptedResponse.json(payload))
+
+    api = EOApiClient(
+        DEFAULT_USERNAME,
+        DEFAULT_PASSWORD,
+        transport,
+        rate_limiter=EORateLimiter(rate=1e6, burst=1e6),
+    )
+    await api.async_get_session()
+    return api
+
+
+def make_coordinator(hass: HomeAssistant, api: EOApiClient):
+    "A coordinator polling through the given client"
+    return EODataUpdateCoordinator(
+        hass,
+        client=api,
+        scheduler=EOPollScheduler(
+            charging=timedelta(seconds=30),
+            connected=timedelta(minutes=5),
+            idle=timedelta(minutes=30),
+        ),
+    )
+
+
+async def test_request_overhead(benchmark_async, api: EOApiClient):
+    "A request to the simulator, which answers at once"
+    session = await benchmark_async(api.async_get_session)
+    assert session.eskwh >= 0
+
+
+async def test_request_overhead_in_memory(benchmark_async, memory_api: EOApiClient):
+    "A request answered from memory, timing only the client"
+    session = await benchmark_async(memory_api.async_get_session)
+    assert session.eskwh >= 0
+
+
+async def test_reauth(benchmark_async, api: EOApiClient, simulator: EOCloudSimulator):
+    "A request made with an expired token, which logs in again and retries"
+
+    calls = 0
+
+    async def request_with_expired_token():
+        nonlocal calls
+        calls += 1
+        simulator.expire_tokens()
+        return await api.async_get_session()
+
+    await benchmark_async(request_with_expired_token)
+    assert api.metrics.reauths == calls
+
+
+async def test_refresh_cycle(hass: HomeAssistant, benchmark_async, api: EOApiClient):
+    "A full refresh of the coordinator against the simulator"
+    coordinator = make_coordinator(hass, api)
+    session = await benchmark_async(coordinator._async_update_data)
+    assert session.eskwh >= 0
+    assert set(coordinator.devices) == {"EM-12345"}
+
+
+async def test_refresh_cycle_in_memory(
+    hass: HomeAssistant, benchmark_async, memory_api: EOApiClient
+):
+    "A full refresh of the coordinator answered from memory"
+    coordinator = make_coordinator(hass, memory_api)
+    session = await benchmark_async(coordinator._async_update_data)
+    assert session.eskwh >= 0
+    assert set(coordinator.devices) == {"EM-12345"}
+
+
+def test_decode_list(benchmark):
+    "Decoding a large charger list into models"
+    body = json.dumps(many_minis(LARGE_LIST)).encode()
+    minis = benchmark(_parse_json, body, EOMini.from_json_list)
+    assert len(minis) == LARGE_LIST
+
+
+def test_decode_user(benchmark):
+    "Decoding the user payload"
+    body = json.dumps(json_load_file("user.json")).encode()
+    user = benchmark(_parse_json, body, None)
+    assert user["email"]
+
+
+async def test_entity_updates(hass: HomeAssistant, benchmark, mock_api):
+    "Every entity on an account with many chargers writing a new state"
+    config_entry = MockConfigEntry(domain=DOMAIN, data=MOCK_CONFIG, entry_id="test")
+    config_entry.add_to_hass(hass)
+    minis = many_minis(CHARGERS)
+    mock_api.async_get_list.return_value = EOMini.from_json_list(minis)
+
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+    coordinator: EODataUpdateCoordinator = hass.data[DOMAIN][config_entry.entry_id]
+
+    # Alternate every charger's lock so each update has a change to write.
+    lists = [
+        EOMini.from_json_list([{**mini, "isDisabled": locked} for mini in minis])
+        for locked in (1, 0)
+    ]
+    rounds = iter(range(10**9))
+
+    def update():
+        coordinator._set_minis_list(lists[next(rounds) % 2])
+        coordinator._take_snapshots(coordinator.data)
+        coordinator.async_update_listeners()
+
+    benchmark(update)
+    assert len(hass.states.async_entity_ids("switch")) == CHARGERS
+
+    assert await hass.config_entries.async_unload(config_entry.entry_id)
@@ -14,10 +14,19 @@
 #
 # See here for more info: https://docs.pytest.org/en/latest/fixture.html (note that
 # pytest includes fixtures OOB which you can use as defined on this page)
+from types import SimpleNamespace
 from unittest.mock import patch
 
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
 import pytest
 
+from custom_components.eo_mini.api import EOApiClient
+from custom_components.eo_mini.models import EOMini, EOSession
+from custom_components.eo_mini.resilience import EORateLimiter, EORetryPolicy
+from tests import json_load_file
+from tests.simulator import DEFAULT_PASSWORD, DEFAULT_USERNAME, EOCloudSimulator
+
 pytest_plugins = "pytest_homeassistant_custom_component"
 
 
@@ -40,6 +49,62 @@ def skip_notifications_fixture():
         yield
 
 
+# This fixture patches the API calls the coordinator polls to return the example
+# data. Tests change what a call returns through the mocks it yields, e.g.
+# mock_api.async_get_list.return_value = minis.
+@pytest.fixture(name="mock_api")
+def mock_api_fixture():
+    """Answer the coordinator's API calls with the example data."""
+    with patch(
+        "custom_components.eo_mini.EOApiClient.async_get_list",
+        return_value=EOMini.from_json_list(json_load_file("list.json")),
+    ) as get_list, patch(
+        "custom_components.eo_mini.EOApiClient.async_get_user",
+        return_value=json_load_file("user.json"),
+    ) as get_user, patch(
+        "custom_components.eo_mini.EOApiClient.async_get_session",
+        return_value=EOSession.from_json(json_load_file("session_charging.json")),
+    ) as get_session, patch(
+        "custom_components.eo_mini.EOApiClient.async_get_session_liveness",
+        return_value=True,
+    ) as get_session_liveness, patch(
+        "custom_components.eo_mini.EOApiClient.async_warm_up"
+    ) as warm_up:
+        yield SimpleNamespace(
+            async_warm_up=warm_up,
+            async_get_list=get_list,
+            async_get_user=get_user,
+            async_get_session=get_session,
+            async_get_session_liveness=get_session_liveness,
+        )
+
+
+# These fixtures run the real client against the EO cloud simulator, which tests
+# set up after it has started, e.g. simulator.plug_in() or simulator.inject(...).
+# Tests swap the client's policies through its attributes, or make their own
+# client for simulator.base_url.
+@pytest.fixture(name="simulator")
+async def simulator_fixture(socket_enabled):
+    """Serve the EO cloud simulator for the test."""
+    simulator = EOCloudSimulator()
+    await simulator.async_start()
+    yield simulator
+    await simulator.async_stop()
+
+
+@pytest.fixture(name="api")
+def api_fixture(hass: HomeAssistant, simulator: EOCloudSimulator):
+    """A client for the simulator that retries at once and isn't rate limited."""
+    return EOApiClient(
+        DEFAULT_USERNAME,
+        DEFAULT_PASSWORD,
+        async_get_clientsession(hass),
+        base_url=simulator.base_url,
+        retry_policy=EORetryPolicy(base_delay=0),
+        rate_limiter=EORateLimiter(rate=1e6, burst=1e6),
+    )
+
+
 # # In this fixture, we are forcing calls to async_get_data to raise an Exception. This is useful
 # # for exception handling.
 # @pytest.fixture(name="error_on_get_data")
@@ -0,0 +1,312 @@
+"""
+Local stand-in for the EO cloud API.
+
+Serves the endpoints EOApiClient uses, with scriptable latency, error injection,
+token expiry and a charging session that progresses in real (or accelerated)
+time. Use it from tests by starting an EOCloudSimulator and pointing an
+EOApiClient at its base_url, or run it standalone for manual testing and
+benchmarking:
+
+    python -m tests.simulator --port 8080 --latency 0.2 --plug-in --charge 7000
+"""
+
+import argparse
+import asyncio
+from collections import Counter, deque
+from dataclasses import dataclass
+import hashlib
+import json
+import secrets
+import time
+from urllib.parse import parse_qsl
+
+from aiohttp import web
+
+from tests import json_load_file
+
+DEFAULT_USERNAME = "user@example.com"
+DEFAULT_PASSWORD = "password"
+
+
+@dataclass
+class Fault:
+    "A scripted misbehaviour for the next request to an endpoint"
+
+    status: int | None = None
+    delay: float = 0.0
+    hang: bool = False
+
+
+class EOCloudSimulator:
+    "An aiohttp server emulating the parts of the EO cloud the integration uses"
+
+    def __init__(
+        self,
+        username: str = DEFAULT_USERNAME,
+        password: str = DEFAULT_PASSWORD,
+        token_lifetime: float = 30 * 24 * 3600,
+        latency: float = 0.0,
+        speedup: float = 1.0,
+        minis: list[dict] | None = None,
+    ) -> None:
+        "Initialise with the account's credentials and the server's behaviour"
+        self.username = username
+        self.password = password
+        self.token_lifetime = token_lifetime
+        self.latency = latency
+        self.endpoint_latency: dict[str, float] = {}
+        self.speedup = speedup
+        self.user = json_load_file("user.json")
+        self.minis = minis if minis is not None else json_load_file("list.json")
+        self.history: list[dict] = []  # past sessions, oldest first
+        self.requests: Counter[str] = Counter()
+        self.base_url = None
+
+        self._tokens: dict[str, float] = {}
+        self._faults: dict[str, deque[Fault]] = {}
+        self._session = None
+        self._power = 0.0
+        self._epoch = time.time()
+        self._since = self._epoch
+        self._stopping = asyncio.Event()
+        self._runner = None
+
+        self.app = web.Application(middlewares=[self._middleware])
+        self.app.router.add_post("/token", self._token)
+        self.app.router.add_get("/api/user", self._get_user)
+        self.app.router.add_get("/api/mini/list", self._get_list)
+        self.app.router.add_get("/api/session", self._get_session)
+        self.app.router.add_get("/api/session/alive", self._get_session_alive)
+        self.app.router.add_get("/api/session/history", self._get_session_history)
+        self.app.router.add_post("/api/mini/enable", self._post_enable)
+        self.app.router.add_post("/api/mini/disable", self._post_disable)
+
+    async def async_start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        "Start serving, returning the base URL to give to EOApiClient"
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        host, port = self._runner.addresses[0][:2]
+        self.base_url = f"http://{host}:{port}"
+        return self.base_url
+
+    async def async_stop(self) -> None:
+        "Release any delayed or hung requests and stop serving"
+        self._stopping.set()
+        await self._runner.cleanup()
+
+    # Scripting
+
+    def inject(self, path: str, count: int = 1, **fault) -> None:
+        "Make the next count requests to path misbehave, see Fault"
+        self._faults.setdefault(path, deque()).extend(
+            Fault(**fault) for _ in range(count)
+        )
+
+    def expire_tokens(self) -> None:
+        "Invalidate every issued token, as if they had all expired"
+        self._tokens.clear()
+
+    def plug_in(self) -> None:
+        "Connect a vehicle, starting a session that isn't charging yet"
+        self._session = {
+            **json_load_file("session_charging.json"),
+            "PiTime": int(self._now()),
+            "ESKWH": 0,
+            "ChargingTime": 0,
+        }
+        self._power = 0.0
+        self._since = self._now()
+
+    def charge(self, power: float) -> None:
+        "Deliver power (W) to the connected vehicle from now on, 0 to stop"
+        self._progress()
+        self._power = power
+
+    def unplug(self) -> None:
+        "Disconnect the vehicle, ending the session"
+        self._session = None
+
+    # Session progression
+
+    def _now(self) -> float:
+        "The simulated wall clock, which runs speedup times faster than real time"
+        return self._epoch + (time.time() - self._epoch) * self.speedup
+
+    def _progress(self) -> None:
+        "Bring the session's energy and charging time up to date"
+        if self._session is None:
+            return
+        now = self._now()
+        elapsed = now - self._since
+        self._since = now
+        if self._power:
+            # ESKWH is reported in watt-seconds, see EOMiniChargerSessionEnergySensor
+            self._session["ESKWH"] += int(self._power * elapsed)
+            self._session["ChargingTime"] += int(elapsed)
+
+    # Request handling
+
+    @web.middleware
+    async def _middleware(self, request: web.Request, handler):
+        "Count requests and apply latency and scripted faults"
+        self.requests[request.path] += 1
+        delay = self.endpoint_latency.get(request.path, self.latency)
+
+        fault = None
+        if faults := self._faults.get(request.path):
+            fault = faults.popleft()
+            delay += fault.delay
+
+        if delay:
+            # Cut short when stopping, so no request outlives the simulator
+            try:
+                await asyncio.wait_for(self._stopping.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+        if fault and fault.hang:
+            await self._stopping.wait()
+            raise web.HTTPServiceUnavailable()
+        if fault and fault.status:
+            return web.json_response({"message": "Injected fault"}, status=fault.status)
+
+        if request.path != "/token" and not self._authorised(request):
+            # EO answers requests with a stale bearer token with a 400.
+            return web.json_response(
+                {"message": "Authorization has been denied for this request."},
+                status=400,
+            )
+
+        return await handler(request)
+
+    def _authorised(self, request: web.Request) -> bool:
+        "Whether the request carries a token that has been issued and not expired"
+        scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+        expires = self._tokens.get(token)
+        return scheme == "Bearer" and expires is not None and time.time() < expires
+
+    @staticmethod
+    async def _form(request: web.Request) -> dict[str, str]:
+        "Decode a form body, which EOApiClient doesn't always label as one"
+        return dict(parse_qsl(await request.text()))
+
+    async def _token(self, request: web.Request) -> web.Response:
+        "Exchange a username and password for a bearer token"
+        form = await self._form(request)
+        if (
+            form.get("grant_type") != "password"
+            or form.get("username") != self.username
+            or form.get("password") != self.password
+        ):
+            return web.json_response(
+                {
+                    "error": "invalid_grant",
+                    "error_description": "The user name or password is incorrect.",
+                },
+                status=400,
+            )
+
+        token = secrets.token_urlsafe(32)
+        self._tokens[token] = time.time() + self.token_lifetime
+        return web.json_response(
+            {
+                "access_token": token,
+                "token_type": "bearer",
+                "expires_in": int(self.token_lifetime),
+                "userName": self.username,
+            }
+        )
+
+    @staticmethod
+    def _revalidated(request: web.Request, data) -> web.Response:
+        "A JSON response with an ETag, or a 304 if the client already has it"
+        body = json.dumps(data).encode()
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={"ETag": etag})
+        return web.Response(
+            body=body, content_type="application/json", headers={"ETag": etag}
+        )
+
+    async def _get_user(self, request: web.Request) -> web.Response:
+        return self._revalidated(request, self.user)
+
+    async def _get_list(self, request: web.Request) -> web.Response:
+        return self._revalidated(request, self.minis)
+
+    async def _get_session(self, _request: web.Request) -> web.Response:
+        if self._session is None:
+            raise web.HTTPNotFound()
+        self._progress()
+        return web.json_response(self._session)
+
+    async def _get_session_alive(self, _request: web.Request) -> web.Response:
+        if self._session is None:
+            return web.json_response(None)
+        return web.json_response({"USID": self._session["USID"]})
+
+    async def _get_session_history(self, request: web.Request) -> web.Response:
+        "A page of the past sessions"
+        page = int(request.query.get("page", 0))
+        size = int(request.query.get("pageSize", 100))
+        return web.json_response(self.history[page * size : (page + 1) * size])
+
+    async def _post_enable(self, request: web.Request) -> web.Response:
+        return await self._set_disabled(request, 0)
+
+    async def _post_disable(self, request: web.Request) -> web.Response:
+        return await self._set_disabled(request, 1)
+
+    async def _set_disabled(self, request: web.Request, disabled: int) -> web.Response:
+        "Lock or unlock the charger with the posted address"
+        form = await self._form(request)
+        for mini in self.minis:
+            if mini["address"] == form.get("id"):
+                mini["isDisabled"] = disabled
+                return web.Response(text="")
+        raise web.HTTPNotFound()
+
+
+async def _async_main(args: argparse.Namespace) -> None:
+    "Run the simulator until interrupted"
+    simulator = EOCloudSimulator(
+        username=args.username,
+        password=args.password,
+        token_lifetime=args.token_lifetime,
+        latency=args.latency,
+        speedup=args.speedup,
+    )
+    if args.plug_in:
+        simulator.plug_in()
+        simulator.charge(args.charge)
+
+    base_url = await simulator.async_start(args.host, args.port)
+    print(f"EO cloud simulator listening on {base_url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await simulator.async_stop()
+
+
+def main() -> None:
+    "Parse the command line and run the simulator"
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--username", default=DEFAULT_USERNAME)
+    parser.add_argument("--password", default=DEFAULT_PASSWORD)
+    parser.add_argument("--token-lifetime", type=float, default=30 * 24 * 3600)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds")
+    parser.add_argument("--speedup", type=float, default=1.0)
+    parser.add_argument("--plug-in", action="store_true")
+    parser.add_argument("--charge", type=float, default=0.0, help="watts")
+
+    try:
+        asyncio.run(_async_main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,37 @@
 """Tests for eo_mini api."""
+
+import asyncio
+from datetime import datetime, timezone
+import logging
+import aiohttp
+from unittest.mock import patch
 import pytest
 from homeassistant.core import HomeAssistant
 from homeassistant.helpers.aiohttp_client import async_get_clientsession
 from pytest_homeassistant_custom_component.test_util.aiohttp import AiohttpClientMocker
-from custom_components.eo_mini.api import EOApiClient, EOAuthError
+from custom_components.eo_mini.api import EOApiClient, EOApiError, EOAuthError
+from custom_components.eo_mini.models import EOMini, EOSession
+from custom_components.eo_mini.resilience import (
+    CIRCUIT_CLOSED,
+    CIRCUIT_OPEN,
+    EOCircuitBreaker,
+    EOCircuitOpenError,
+    EORateLimiter,
+    EORetryPolicy,
+)
+from custom_components.eo_mini.tracing import EORequestTiming, eo_trace_config
+from custom_components.eo_mini.transport import (
+    EOAiohttpTransport,
+    EOMemoryTransport,
+    EOScriptedResponse,
+)
 from tests import json_load_file
+from tests.simulator import DEFAULT_PASSWORD, DEFAULT_USERNAME, EOCloudSimulator
 
 
-def add_successful_auth_request(aioclient_mock: AiohttpClientMocker):
+def add_successful_auth_request(
+    aioclient_mock: AiohttpClientMocker, expires_in: int = 100000
+):
     "Add the auth request we must issue to get the bearer token for API calls"
     aioclient_mock.post(
         "https://eoappi.eocharging.com/token",
@@ -15,7 +39,7 @@ def add_successful_auth_request(aioclient_mock: AiohttpClientMocker):
         json={
             "access_token": "test_token_data_123498712349862314987",
             "token_type": "bearer",
-            "expires_in": 100000,
+            "expires_in": expires_in,
             "userName": "test@example.com",
             ".issued": "Thu, 29 Sep 2022 12:53:41 GMT",
             ".expires": "Sat, 29 Oct 2022 12:53:41 GMT",
@@ -79,3 +103,366 @@ async def test_post_disable(hass: HomeAssistant, aioclient_mock: AiohttpClientMo
     )
 
     await api.async_post_disable("00000000")
+
+
+def token_requests(aioclient_mock: AiohttpClientMocker) -> int:
+    "Count the logins issued so far"
+    return sum(1 for call in aioclient_mock.mock_calls if call[1].path == "/token")
+
+
+async def test_concurrent_requests_share_one_login(
+    hass: HomeAssistant, aioclient_mock: AiohttpClientMocker
+):
+    "Concurrent requests without a token wait on a single login"
+
+    api = EOApiClient("test", "test", async_get_clientsession(hass))
+
+    add_successful_auth_request(aioclient_mock)
+
+    aioclient_mock.get(
+        "https://eoappi.eocharging.com/api/mini/list",
+        headers={"Content-Type": "application/json; charset=utf-8"},
+        json=json_load_file("list.json"),
+    )
+    aioclient_mock.get(
+        "https://eoappi.eocharging.com/api/user",
+        headers={"Content-Type": "application/json; charset=utf-8"},
+        json=json_load_file("user.json"),
+    )
+    aioclient_mock.get("https://eoappi.eocharging.com/api/session", status=404)
+
+    await asyncio.gather(
+        api.async_get_list(), api.async_get_user(), api.async_get_session()
+    )
+    assert token_requests(aioclient_mock) == 1
+
+    await api.async_get_list()
+    assert token_requests(aioclient_mock) == 1
+
+
+async def test_login_again_before_expiry(
+    hass: HomeAssistant, aioclient_mock: AiohttpClientMocker, freezer
+):
+    "A short-lived token is used for half its life, then replaced before it expires"
+
+    api = EOApiClient("test", "test", async_get_clientsession(hass))
+
+    add_successful_auth_request(aioclient_mock, expires_in=60)
+
+    aioclient_mock.get(
+        "https://eoappi.eocharging.com/api/session",
+        headers={"Content-Type": "application/json; charset=utf-8"},
+        json=json_load_file("session_charging.json"),
+    )
+
+    await api.async_get_session()
+    await api.async_get_session()
+    assert token_requests(aioclient_mock) == 1
+
+    freezer.tick(31)
+    await api.async_get_session()
+    assert token_requests(aioclient_mock) == 2
+
+
+async def test_simulated_session_and_reauth(
+    api: EOApiClient, simulator: EOCloudSimulator
+):
+    "Run the client against the local EO cloud simulator"
+
+    simulator.speedup = 3600
+    assert await api.async_get_session() is None
+    assert not await api.async_get_session_liveness()
+
+    simulator.plug_in()
+    simulator.charge(7000)
+    assert await api.async_get_session_liveness()
+
+    # A stale token is replaced transparently
+    simulator.expire_tokens()
+    session = await api.async_get_session()
+    assert session.eskwh > 0
+    assert simulator.requests["/token"] == 2
+
+    simulator.inject("/api/mini/list", count=3, status=500)
+    with pytest.raises(EOApiError) as api_error:
+        await api.async_get_list()
+    assert api_error.value.status == 500
+
+    assert api.metrics.reauths == 1
+    assert api.metrics.retries == 2
+    assert api.metrics.endpoints["/api/mini/list"].errors == {500: 3}
+
+    await api.async_post_disable("0000ABCD")
+    assert (await api.async_get_list())[0].is_disabled
+
+
+async def test_transient_failures_retried(
+    api: EOApiClient, simulator: EOCloudSimulator
+):
+    "GETs are retried through transient failures, posts never are"
+
+    simulator.inject("/api/mini/list", count=2, status=503)
+    assert (await api.async_get_list())[0].hub_serial
+    assert simulator.requests["/api/mini/list"] == 3
+    assert api.metrics.retries == 2
+
+    simulator.inject("/api/mini/disable", status=503)
+    with pytest.raises(EOApiError):
+        await api.async_post_disable("0000ABCD")
+    assert simulator.requests["/api/mini/disable"] == 1
+
+
+async def test_timeouts_not_retried(api: EOApiClient, simulator: EOCloudSimulator):
+    "A request that times out fails at once but counts against the breaker"
+
+    api.circuit_breaker = EOCircuitBreaker(failure_threshold=1)
+    await api.async_get_session()
+
+    simulator.inject("/api/session", delay=0.2)
+    with patch("custom_components.eo_mini.api.TIMEOUT", 0.05), pytest.raises(
+        asyncio.TimeoutError
+    ):
+        await api.async_get_session()
+    assert simulator.requests["/api/session"] == 2
+    assert api.metrics.retries == 0
+    assert api.circuit_breaker.state == CIRCUIT_OPEN
+
+
+async def test_retry_after_honoured(
+    hass: HomeAssistant, aioclient_mock: AiohttpClientMocker
+):
+    "A Retry-After longer than the policy allows fails at once"
+
+    api = EOApiClient(
+        "test", "test", async_get_clientsession(hass), retry_policy=EORetryPolicy()
+    )
+    add_successful_auth_request(aioclient_mock)
+    aioclient_mock.get(
+        "https://eoappi.eocharging.com/api/mini/list",
+        status=429,
+        headers={"Retry-After": "3600"},
+    )
+
+    with pytest.raises(EOApiError) as api_error:
+        await api.async_get_list()
+    assert api_error.value.status == 429
+    assert api.metrics.retries == 0
+
+    policy = EORetryPolicy(base_delay=100, max_delay=10)
+    assert policy.delay(0, "2") == 2
+    assert 0 <= policy.delay(1) <= 10
+    assert policy.delay(2) is None
+
+
+async def test_circuit_breaker_fails_fast(
+    api: EOApiClient, simulator: EOCloudSimulator
+):
+    "Once the cloud keeps failing, requests are refused until a probe succeeds"
+
+    api.retry_policy = EORetryPolicy(attempts=1)
+    api.circuit_breaker = EOCircuitBreaker(failure_threshold=2, reset_timeout=0.1)
+
+    simulator.inject("/api/session", count=2, status=502)
+    for _ in range(2):
+        with pytest.raises(EOApiError):
+            await api.async_get_session()
+    assert api.circuit_breaker.state == CIRCUIT_OPEN
+
+    with pytest.raises(EOCircuitOpenError):
+        await api.async_get_session()
+    assert simulator.requests["/api/session"] == 2
+
+    await asyncio.sleep(0.1)
+    assert await api.async_get_session() is None
+    assert api.circuit_breaker.state == CIRCUIT_CLOSED
+
+
+async def test_identical_requests_coalesced(
+    api: EOApiClient, simulator: EOCloudSimulator
+):
+    "Concurrent identical GETs share one request, even if a caller gives up"
+
+    simulator.plug_in()
+    simulator.endpoint_latency["/api/session"] = 0.05
+
+    impatient = asyncio.ensure_future(api.async_get_session())
+    pending = [api.async_get_session() for _ in range(3)]
+    await asyncio.sleep(0)
+    impatient.cancel()
+    sessions = await asyncio.gather(*pending)
+
+    assert all(session == sessions[0] for session in sessions)
+    assert simulator.requests["/api/session"] == 1
+    assert api.metrics.coalesced == 3
+
+    await api.async_get_session()
+    assert simulator.requests["/api/session"] == 2
+
+
+async def test_static_responses_cached_and_revalidated(
+    api: EOApiClient, simulator: EOCloudSimulator
+):
+    "The charger list is reused, revalidated with its ETag and dropped on a toggle"
+
+    minis = await api.async_get_list()
+    assert await api.async_get_list() is minis
+    assert simulator.requests["/api/mini/list"] == 1
+
+    for cached in api._cache.values():
+        cached.expires = 0
+    assert await api.async_get_list() is minis
+    assert simulator.requests["/api/mini/list"] == 2
+    assert api.metrics.endpoints["/api/mini/list"].errors == {}
+    assert api.metrics.cache_hits == 2
+
+    await api.async_post_disable(minis[0].address)
+    minis = await api.async_get_list()
+    assert minis[0].is_disabled
+    assert simulator.requests["/api/mini/list"] == 3
+
+    # A list fetched while the charger was being unlocked is neither shared
+    # with later callers nor cached
+    simulator.endpoint_latency["/api/mini/list"] = 0.1
+    for cached in api._cache.values():
+        cached.expires = 0
+    stale = asyncio.ensure_future(api.async_get_list())
+    await asyncio.sleep(0.05)
+    await api.async_post_enable(minis[0].address)
+    assert not api._inflight
+    assert not (await api.async_get_list())[0].is_disabled
+    await stale
+    assert not (await api.async_get_list())[0].is_disabled
+    assert simulator.requests["/api/mini/list"] == 5
+
+
+async def test_rate_limiter_spaces_out_bursts():
+    "Requests beyond the burst wait for the bucket to refill"
+
+    limiter = EORateLimiter(rate=20, burst=2)
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    for _ in range(4):
+        await limiter.async_acquire()
+    assert loop.time() - start >= 0.09
+
+
+async def test_request_timing_logged_at_debug(simulator: EOCloudSimulator, caplog):
+    "Traced requests log where their time went, only when debug logging is on"
+
+    session = aiohttp.ClientSession(trace_configs=[eo_trace_config()])
+    try:
+        api = EOApiClient(
+            DEFAULT_USERNAME, DEFAULT_PASSWORD, session, simulator.base_url
+        )
+
+        caplog.set_level(logging.INFO, logger="custom_components.eo_mini.api")
+        with patch(
+            "custom_components.eo_mini.api.EORequestTiming",
+            side_effect=AssertionError("timed without debug logging"),
+        ):
+            await api.async_get_session()
+        assert "Timing:" not in caplog.text
+        # Connections are still told apart: the login opened one, then reused it
+        connections = api.metrics.as_dict()["connections"]
+        assert connections["cold"]["count"] == 1
+        assert connections["warm"]["count"] == 1
+
+        caplog.set_level(logging.DEBUG, logger="custom_components.eo_mini.api")
+        await api.async_get_session()
+        assert "Timing: GET" in caplog.text
+        assert "ttfb=" in caplog.text
+        assert "reused connection" in caplog.text
+    finally:
+        await session.close()
+
+
+def test_connect_timing_excludes_dns():
+    "The host lookup inside connection creation is timed on its own"
+
+    timing = EORequestTiming("get", "https://example.com/")
+    clock = iter([0.0, 1.0, 2.0, 3.5])
+    with patch("custom_components.eo_mini.tracing.monotonic", lambda: next(clock)):
+        timing.connect_started()
+        timing.dns_started()
+        timing.dns_ended()
+        timing.connect_ended()
+
+    assert timing.dns == 1.0
+    assert timing.connect == 2.5
+
+
+def test_payloads_pruned_to_models():
+    "Only the fields the integration reads are kept from the payloads"
+
+    minis = EOMini.from_json_list(json_load_file("list.json"))
+    assert minis == [EOMini("EM-12345", "0000ABCD", False)]
+    assert EOMini.from_json(minis[0].as_json()) == minis[0]
+
+    session = EOSession.from_json(json_load_file("session_charging.json"))
+    assert session == EOSession(1664549399, 81322788, 11580)
+    assert not hasattr(session, "__dict__")
+    assert session.energy == 81322788 / 3600
+    assert session.started == datetime(2022, 9, 30, 14, 49, 59, tzinfo=timezone.utc)
+
+
+async def test_memory_transport_runs_whole_client():
+    "The client runs over scripted in-memory responses, with no network"
+
+    transport = EOMemoryTransport()
+    transport.route(
+        "post", "/token", EOScriptedResponse.json({"access_token": "token"})
+    )
+    transport.route(
+        "get",
+        "/api/session",
+        EOScriptedResponse.json(json_load_file("session_charging.json")),
+    )
+    transport.queue(
+        "get",
+        "/api/session",
+        [EOScriptedResponse(503), aiohttp.ClientConnectionError()],
+    )
+    api = EOApiClient(
+        "user", "pass", transport, retry_policy=EORetryPolicy(base_delay=0)
+    )
+
+    session = await api.async_get_session()
+    assert session.eskwh == 81322788
+    assert transport.requests == {("post", "/token"): 1, ("get", "/api/session"): 3}
+    assert api.metrics.retries == 2
+
+    # Unscripted routes are missing
+    assert await api.async_get_list() is None
+
+
+async def test_warm_up_connects_and_logs_in(simulator: EOCloudSimulator):
+    "Warming up leaves a logged in client with a connection ready to reuse"
+
+    base_url = simulator.base_url
+    transport = EOAiohttpTransport.create(trace_configs=[eo_trace_config()])
+    try:
+        api = EOApiClient(
+            DEFAULT_USERNAME, DEFAULT_PASSWORD, transport, base_url=base_url
+        )
+        await api.async_warm_up()
+        assert api.warm_up_time is not None
+        assert simulator.requests["/token"] == 1
+
+        await api.async_get_list()
+        connections = api.metrics.as_dict()["connections"]
+        assert connections["cold"]["count"] == 1  # the login
+        assert connections["warm"]["count"] == 1
+        assert simulator.requests["/token"] == 1
+
+        # Failures are left for the requests to report
+        simulator.inject("/", hang=True)
+        simulator.expire_tokens()
+        simulator.inject("/token", status=500)
+        api = EOApiClient(
+            DEFAULT_USERNAME, DEFAULT_PASSWORD, transport, base_url=base_url
+        )
+        with patch("custom_components.eo_mini.api.TIMEOUT", 0.1):
+            await api.async_warm_up()
+        assert api.warm_up_time is not None
+    finally:
+        await transport.async_close()
@@ -7,7 +7,16 @@ import pytest
 from pytest_homeassistant_custom_component.common import MockConfigEntry
 from custom_components.eo_mini.api import EOAuthError
 
-from custom_components.eo_mini.const import DOMAIN, CONF_POLL_INTERVAL
+from custom_components.eo_mini.const import (
+    CONF_CHARGING_POLL_INTERVAL,
+    CONF_FIRST_REFRESH_TIMEOUT,
+    CONF_IDLE_POLL_INTERVAL,
+    DOMAIN,
+    CONF_POLL_INTERVAL,
+    DEFAULT_CHARGING_POLL_INTERVAL,
+    DEFAULT_FIRST_REFRESH_TIMEOUT,
+    DEFAULT_IDLE_POLL_INTERVAL,
+)
 
 from .const import MOCK_CONFIG
 
@@ -126,5 +135,10 @@ async def test_options_flow(hass):
     assert result["type"] == data_entry_flow.RESULT_TYPE_CREATE_ENTRY
     assert result["title"] == "test_username"
 
-    # Verify that the options were updated
-    assert entry.options == {CONF_POLL_INTERVAL: 100}
+    # Verify that the options were updated, with defaults for the ones left alone
+    assert entry.options == {
+        CONF_POLL_INTERVAL: 100,
+        CONF_CHARGING_POLL_INTERVAL: DEFAULT_CHARGING_POLL_INTERVAL,
+        CONF_IDLE_POLL_INTERVAL: DEFAULT_IDLE_POLL_INTERVAL,
+        CONF_FIRST_REFRESH_TIMEOUT: DEFAULT_FIRST_REFRESH_TIMEOUT,
+    }
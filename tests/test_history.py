@@ -0,0 +1,100 @@
+"""Test the EO session history import."""
+
+import asyncio
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+import pytest
+from homeassistant.core import HomeAssistant
+
+from custom_components.eo_mini.api import EOApiClient
+from custom_components.eo_mini.history import EOHistoryImporter
+from custom_components.eo_mini.storage import EOAccountCache
+from tests.simulator import EOCloudSimulator
+
+HOUR = 1700000000 - 1700000000 % 3600
+
+
+def past_session(pi_time: int, wh: float, charging_time: int) -> dict:
+    "A session record as the history endpoint returns it"
+    return {"PiTime": pi_time, "ESKWH": int(wh * 3600), "ChargingTime": charging_time}
+
+
+async def test_history_imported_hourly_and_resumed(
+    hass: HomeAssistant, api: EOApiClient, simulator: EOCloudSimulator
+):
+    "Sessions are summed by start hour, a page at a time, resuming from a checkpoint"
+
+    simulator.history = [
+        past_session(HOUR + 60, 1000, 600),
+        past_session(HOUR + 1800, 2000, 1200),
+        past_session(HOUR + 3 * 3600, 4000, 2400),
+    ]
+    api.history_page_size = 2
+    cache = EOAccountCache(hass, "ENTRY")
+    importer = EOHistoryImporter(hass, api, cache, "ENTRY")
+    importer.page_interval = 0
+
+    with patch(
+        "custom_components.eo_mini.history.async_add_external_statistics"
+    ) as add_statistics:
+        assert await importer.async_import() == 3
+
+    # One batch per page for each statistic
+    assert add_statistics.call_count == 4
+    energy = [
+        row
+        for call in add_statistics.call_args_list
+        if call.args[1]["statistic_id"] == "eo_mini:energy_entry"
+        for row in call.args[2]
+    ]
+    assert [row["start"] for row in energy] == [
+        datetime.fromtimestamp(HOUR, timezone.utc),
+        datetime.fromtimestamp(HOUR + 3 * 3600, timezone.utc),
+    ]
+    assert [row["state"] for row in energy] == pytest.approx([3, 4])
+    assert [row["sum"] for row in energy] == pytest.approx([3, 7])
+    assert cache.get("history")["page"] == 1
+
+    # Only the sessions added since are imported next time, continuing the sums
+    simulator.history.append(past_session(HOUR + 3 * 3600 + 60, 500, 300))
+    with patch(
+        "custom_components.eo_mini.history.async_add_external_statistics"
+    ) as add_statistics:
+        assert await importer.async_import() == 1
+
+    energy, charging_time = (call.args[2] for call in add_statistics.call_args_list)
+    assert energy[0]["state"] == pytest.approx(4.5)
+    assert energy[0]["sum"] == pytest.approx(7.5)
+    assert charging_time[0]["sum"] == 4500
+
+
+async def test_history_streamed_with_bounded_prefetch(
+    api: EOApiClient, simulator: EOCloudSimulator
+):
+    "Pages are requested only a little ahead of the reader, and dropped when it stops"
+
+    simulator.history = [past_session(HOUR + i * 60, 100, 60) for i in range(10)]
+    api.history_page_size = 2
+
+    pages = [page async for page, _ in api.async_iter_session_history(3)]
+    assert pages == [3, 4]
+
+    requested = []
+    get_page = api.async_get_session_history
+
+    async def get_page_then_hang(number: int):
+        requested.append(number)
+        if number > 1:
+            await asyncio.Event().wait()  # EO never answers
+        return await get_page(number)
+
+    with patch.object(api, "async_get_session_history", get_page_then_hang):
+        pages = api.async_iter_session_history(1, prefetch=2)
+        page, sessions = await anext(pages)
+        assert page == 1
+        assert [session.pi_time for session in sessions] == [HOUR + 120, HOUR + 180]
+
+        # Stopping doesn't wait for the page requested ahead
+        await asyncio.wait_for(pages.aclose(), 1)
+    assert requested == [1, 2]
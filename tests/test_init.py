@@ -1,10 +1,21 @@
 "Test integration_blueprint setup process."
+import asyncio
+from datetime import timedelta
+from homeassistant.const import EVENT_HOMEASSISTANT_CLOSE
+from homeassistant.core import State
 from homeassistant.exceptions import ConfigEntryNotReady
 from homeassistant.config_entries import ConfigEntryState
 import pytest
 import aiohttp
 from unittest.mock import patch
-from pytest_homeassistant_custom_component.common import MockConfigEntry
+from homeassistant.components.diagnostics import REDACTED
+from homeassistant.helpers import entity_registry as er
+from homeassistant.util import dt as dt_util
+from pytest_homeassistant_custom_component.common import (
+    MockConfigEntry,
+    async_fire_time_changed,
+    mock_restore_cache_with_extra_data,
+)
 
 from custom_components.eo_mini import (
     EODataUpdateCoordinator,
@@ -12,61 +23,496 @@ from custom_components.eo_mini import (
     async_setup_entry,
     async_unload_entry,
 )
-from custom_components.eo_mini.const import DOMAIN
+from custom_components.eo_mini.api import EOAuthError
+from custom_components.eo_mini.const import (
+    CONF_FIRST_REFRESH_TIMEOUT,
+    CONF_PASSWORD,
+    DOMAIN,
+    LIVENESS_PROBE_INTERVAL,
+)
+from custom_components.eo_mini.diagnostics import async_get_config_entry_diagnostics
+from custom_components.eo_mini.registry import async_forget_client, async_get_client
+from custom_components.eo_mini.models import EOMini, EOSession
 from tests import json_load_file
 
 from .const import MOCK_CONFIG
 
 
-async def test_setup_unload_and_reload_entry(hass):
+async def async_wait_background_tasks(hass, config_entry) -> None:
+    "Wait for the entry's background tasks, e.g. a first refresh, to finish"
+    await asyncio.gather(*config_entry._background_tasks)
+    await hass.async_block_till_done()
+
+
+async def test_setup_unload_and_reload_entry(hass, mock_api):
     """Test entry setup and unload."""
     # Create a mock entry so we don't have to go through config flow
     config_entry = MockConfigEntry(
         domain=DOMAIN, data=MOCK_CONFIG, entry_id="test", state=ConfigEntryState.LOADED
     )
 
-    with patch(
-        "custom_components.eo_mini.EOApiClient.async_get_list",
-        return_value=json_load_file("list.json"),
-    ), patch(
-        "custom_components.eo_mini.EOApiClient.async_get_user",
-        return_value=json_load_file("user.json"),
-    ), patch(
-        "custom_components.eo_mini.EOApiClient.async_get_session",
-        return_value=json_load_file("session_charging.json"),
-    ), patch(
-        "custom_components.eo_mini.EOApiClient.async_get_session_liveness",
-        return_value=json_load_file("session_liveness.json"),
-    ):
-        # Set up the entry and assert that the values set during setup are where we expect
-        # them to be. Because we have patched the BlueprintDataUpdateCoordinator.async_get_data
-        # call, no code from custom_components/eo_mini/api.py actually runs.
-        assert await async_setup_entry(hass, config_entry)
-        assert DOMAIN in hass.data and config_entry.entry_id in hass.data[DOMAIN]
-        assert isinstance(
-            hass.data[DOMAIN][config_entry.entry_id], EODataUpdateCoordinator
-        )
+    mock_api.async_get_session_liveness.return_value = False
+
+    # Set up the entry and assert that the values set during setup are where we expect
+    # them to be. Because mock_api patches the EOApiClient calls, no code from
+    # custom_components/eo_mini/api.py actually runs.
+    assert await async_setup_entry(hass, config_entry)
+    assert DOMAIN in hass.data and config_entry.entry_id in hass.data[DOMAIN]
+    assert isinstance(hass.data[DOMAIN][config_entry.entry_id], EODataUpdateCoordinator)
+    mock_api.async_warm_up.assert_called_once()
+
+    client = hass.data[DOMAIN][config_entry.entry_id].api
 
-        # Reload the entry and assert that the data from above is still there
-        assert await async_reload_entry(hass, config_entry) is None
-        assert DOMAIN in hass.data and config_entry.entry_id in hass.data[DOMAIN]
-        assert isinstance(
-            hass.data[DOMAIN][config_entry.entry_id], EODataUpdateCoordinator
-        )
+    # Reload the entry and assert that the data from above is still there
+    assert await async_reload_entry(hass, config_entry) is None
+    assert DOMAIN in hass.data and config_entry.entry_id in hass.data[DOMAIN]
+    assert isinstance(hass.data[DOMAIN][config_entry.entry_id], EODataUpdateCoordinator)
 
-        # Unload the entry and verify that the data has been removed
-        assert await async_unload_entry(hass, config_entry)
-        assert config_entry.entry_id not in hass.data[DOMAIN]
+    # The reloaded entry keeps using the same, already logged in, client
+    assert hass.data[DOMAIN][config_entry.entry_id].api is client
 
+    # Unload the entry and verify that the data has been removed
+    assert await async_unload_entry(hass, config_entry)
+    assert config_entry.entry_id not in hass.data[DOMAIN]
 
-async def test_setup_entry_exception(hass):
+
+async def test_setup_entry_exception(hass, mock_api):
     """Test ConfigEntryNotReady when API raises an exception during entry setup."""
     config_entry = MockConfigEntry(domain=DOMAIN, data=MOCK_CONFIG, entry_id="test")
 
     # In this case we are testing the condition where async_setup_entry raises
-    # ConfigEntryNotReady when the API raises an error during login
-    with patch(
-        "custom_components.eo_mini.EOApiClient.async_get_user",
-        side_effect=aiohttp.ClientError,
-    ), pytest.raises(ConfigEntryNotReady):
+    # ConfigEntryNotReady when the API can't be reached
+    # Warming up never raises, so only the calls the refresh makes fail
+    for call in vars(mock_api).values():
+        if call is not mock_api.async_warm_up:
+            call.side_effect = aiohttp.ClientError
+    with pytest.raises(ConfigEntryNotReady):
         assert await async_setup_entry(hass, config_entry)
+
+
+async def test_setup_entry_auth_failure(hass, mock_api):
+    """Test rejected credentials at setup ask to reauthenticate rather than retry."""
+    config_entry = MockConfigEntry(domain=DOMAIN, data=MOCK_CONFIG, entry_id="test")
+    config_entry.add_to_hass(hass)
+
+    for call in vars(mock_api).values():
+        if call is not mock_api.async_warm_up:
+            call.side_effect = EOAuthError("The user name or password is incorrect.")
+    with patch.object(config_entry, "async_start_reauth") as start_reauth:
+        assert not await hass.config_entries.async_setup(config_entry.entry_id)
+        await hass.async_block_till_done()
+
+    assert config_entry.state is ConfigEntryState.SETUP_ERROR
+    assert start_reauth.called
+
+
+async def test_refresh_keeps_last_session_on_partial_failure(hass, mock_api):
+    """Test a failing liveness call doesn't discard the rest of the refresh."""
+    config_entry = MockConfigEntry(domain=DOMAIN, data=MOCK_CONFIG, entry_id="test")
+
+    assert await async_setup_entry(hass, config_entry)
+
+    coordinator = hass.data[DOMAIN][config_entry.entry_id]
+    assert coordinator.data.eskwh == 81322788
+    assert set(coordinator.fetch_timings) == {"list", "liveness", "session", "user"}
+
+    mock_api.async_get_session.side_effect = aiohttp.ClientError
+    mock_api.async_get_session_liveness.side_effect = TimeoutError
+    await coordinator.async_refresh()
+
+    assert coordinator.last_update_success
+    assert coordinator.live_session is True
+    assert coordinator.data.eskwh == 81322788
+
+    assert await async_unload_entry(hass, config_entry)
+
+
+async def test_forgotten_client_stops_listening_for_close(hass):
+    """Test recreating a client, e.g. on reauth, doesn't pile up close listeners."""
+    listeners = hass.bus.async_listeners().get(EVENT_HOMEASSISTANT_CLOSE, 0)
+
+    client = async_get_client(hass, "user", "old")
+    assert async_get_client(hass, "user", "old") is client
+    assert hass.bus.async_listeners()[EVENT_HOMEASSISTANT_CLOSE] == listeners + 1
+
+    for _ in range(3):
+        async_forget_client(hass, "user")
+        assert async_get_client(hass, "user", "new") is not client
+    assert hass.bus.async_listeners()[EVENT_HOMEASSISTANT_CLOSE] == listeners + 1
+
+    async_forget_client(hass, "user")
+    await hass.async_block_till_done()
+    assert hass.bus.async_listeners().get(EVENT_HOMEASSISTANT_CLOSE, 0) == listeners
+
+
+async def test_setup_entry_from_cache(hass, hass_storage, mock_api):
+    """Test setup doesn't wait for the cloud when the account data is cached."""
+    config_entry = MockConfigEntry(domain=DOMAIN, data=MOCK_CONFIG, entry_id="test")
+    hass_storage[f"{DOMAIN}.test"] = {
+        "version": 1,
+        "key": f"{DOMAIN}.test",
+        "data": {
+            "token": {"token": "cached_token", "expires_at": None},
+            "user": json_load_file("user.json"),
+            "minis": json_load_file("list.json"),
+        },
+    }
+
+    assert await async_setup_entry(hass, config_entry)
+    coordinator = hass.data[DOMAIN][config_entry.entry_id]
+    assert list(coordinator.devices) == ["EM-12345"]
+    assert coordinator.api.token_state["token"] == "cached_token"
+
+    await hass.async_block_till_done()
+
+    mock_api.async_get_user.assert_not_called()
+    assert coordinator.data.eskwh == 81322788
+
+    assert await async_unload_entry(hass, config_entry)
+
+
+async def test_entities_restore_last_state_until_polled(hass, hass_storage, mock_api):
+    """Test the entities show their last states while EO is slow to answer."""
+    config_entry = MockConfigEntry(domain=DOMAIN, data=MOCK_CONFIG, entry_id="test")
+    config_entry.add_to_hass(hass)
+    hass_storage[f"{DOMAIN}.test"] = {
+        "version": 1,
+        "key": f"{DOMAIN}.test",
+        "data": {"minis": json_load_file("list.json")},
+    }
+    mock_restore_cache_with_extra_data(
+        hass,
+        [
+            (
+                State(
+                    "sensor.eo_mini_pro_2_em_12345_consumption",
+                    "1234.5",
+                    {"last_reset": "2022-09-30T14:49:59+00:00"},
+                ),
+                {"native_value": 1234.5, "native_unit_of_measurement": "Wh"},
+            ),
+            (
+                State("sensor.eo_mini_pro_2_em_12345_lifetime_consumption", "5000.0"),
+                {"native_value": 5000.0, "native_unit_of_measurement": "Wh"},
+            ),
+            (
+                State("binary_sensor.eo_mini_pro_2_em_12345_vehicle_connected", "on"),
+                None,
+            ),
+        ],
+    )
+    answer = asyncio.Event()
+
+    async def slow_session():
+        await answer.wait()
+        return EOSession.from_json(json_load_file("session_charging.json"))
+
+    mock_api.async_get_session.side_effect = slow_session
+
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+
+    consumption = hass.states.get("sensor.eo_mini_pro_2_em_12345_consumption")
+    assert consumption.state == "1234.5"
+    assert consumption.attributes["last_reset"] == "2022-09-30T14:49:59+00:00"
+    connected = "binary_sensor.eo_mini_pro_2_em_12345_vehicle_connected"
+    assert hass.states.get(connected).state == "on"
+
+    # The lifetime total carries on from the restored one
+    answer.set()
+    await async_wait_background_tasks(hass, config_entry)
+    lifetime = "sensor.eo_mini_pro_2_em_12345_lifetime_consumption"
+    assert float(hass.states.get(lifetime).state) == pytest.approx(
+        5000 + 81322788 / 3600
+    )
+    assert hass.states.get(connected).state == "on"
+
+    assert await hass.config_entries.async_unload(config_entry.entry_id)
+
+
+async def test_setup_continues_past_first_refresh_deadline(hass, mock_api):
+    """Test a slow first refresh without a cache doesn't hold up setup."""
+    config_entry = MockConfigEntry(
+        domain=DOMAIN,
+        data=MOCK_CONFIG,
+        entry_id="test",
+        options={CONF_FIRST_REFRESH_TIMEOUT: 0.01},
+    )
+    config_entry.add_to_hass(hass)
+    answer = asyncio.Event()
+    minis = mock_api.async_get_list.return_value
+
+    async def slow_list():
+        await answer.wait()
+        return minis
+
+    mock_api.async_get_list.side_effect = slow_list
+
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+    assert config_entry.state is ConfigEntryState.LOADED
+    assert not hass.states.async_entity_ids("switch")
+
+    # The entities are added once the refresh finds the chargers
+    answer.set()
+    await async_wait_background_tasks(hass, config_entry)
+    assert hass.states.get("switch.eo_mini_pro_2_em_12345_lock").state == "off"
+    assert hass.states.get("sensor.eo_mini_pro_2_em_12345_consumption")
+
+    assert await hass.config_entries.async_unload(config_entry.entry_id)
+
+
+async def test_setup_entry_multiple_chargers(hass, mock_api):
+    """Test chargers get their own entities and the account's session is shared."""
+    config_entry = MockConfigEntry(domain=DOMAIN, data=MOCK_CONFIG, entry_id="test")
+    config_entry.add_to_hass(hass)
+    minis = json_load_file("list.json")
+    minis.append({**minis[0], "address": "0000DCBA", "hubSerial": "EMP-67890"})
+
+    mock_api.async_get_list.return_value = EOMini.from_json_list(minis)
+
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+
+    mock_api.async_get_list.assert_called_once()
+    coordinator = hass.data[DOMAIN][config_entry.entry_id]
+    assert set(coordinator.devices) == {"EM-12345", "EMP-67890"}
+    assert hass.states.get("switch.eo_mini_pro_2_em_12345_lock")
+    assert hass.states.get("switch.eo_mini_pro_emp_67890_lock")
+
+    # Nothing says which charger the session is on, so it isn't put on either
+    assert coordinator.session_serial is None
+    assert not hass.states.get("sensor.eo_mini_pro_2_em_12345_consumption")
+    assert not hass.states.get("sensor.eo_mini_pro_emp_67890_consumption")
+    assert hass.states.get("sensor.eo_account_consumption").state == "22589.6633333333"
+    assert hass.states.get("binary_sensor.eo_account_vehicle_connected").state == "on"
+
+    assert await hass.config_entries.async_unload(config_entry.entry_id)
+
+
+async def test_session_entities_follow_charger_count(hass, mock_api):
+    """Test session entities keep their entity IDs when chargers are added or removed."""
+    config_entry = MockConfigEntry(domain=DOMAIN, data=MOCK_CONFIG, entry_id="test")
+    config_entry.add_to_hass(hass)
+    registry = er.async_get(hass)
+    minis = json_load_file("list.json")
+    consumption = "sensor.eo_mini_pro_2_em_12345_consumption"
+    connected = "binary_sensor.eo_mini_pro_2_em_12345_vehicle_connected"
+
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+    assert (
+        registry.async_get(consumption).unique_id == "eo_mini_charger_EM-12345_energy"
+    )
+    assert await hass.config_entries.async_unload(config_entry.entry_id)
+
+    # A second charger moves the session to the account's device
+    mock_api.async_get_list.return_value = EOMini.from_json_list(
+        [*minis, {**minis[0], "address": "0000DCBA", "hubSerial": "EMP-67890"}]
+    )
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+    assert registry.async_get(consumption).unique_id == "eo_mini_account_test_energy"
+    assert (
+        registry.async_get(connected).unique_id
+        == "eo_mini_account_test_vehicle_connected"
+    )
+    assert hass.states.get(consumption).state == "22589.6633333333"
+    assert not hass.states.get("sensor.eo_account_consumption")
+    assert await hass.config_entries.async_unload(config_entry.entry_id)
+
+    # And removing it moves the session back
+    mock_api.async_get_list.return_value = EOMini.from_json_list(minis)
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+    assert (
+        registry.async_get(consumption).unique_id == "eo_mini_charger_EM-12345_energy"
+    )
+    assert (
+        registry.async_get(
+            "sensor.eo_mini_pro_2_em_12345_lifetime_consumption"
+        ).unique_id
+        == "eo_mini_charger_EM-12345_lifetime_energy"
+    )
+    assert hass.states.get(consumption).state == "22589.6633333333"
+
+    assert await hass.config_entries.async_unload(config_entry.entry_id)
+
+
+async def test_unchanged_refresh_skips_state_writes(hass, mock_api):
+    """Test entities only write their state when the polled values change."""
+    config_entry = MockConfigEntry(domain=DOMAIN, data=MOCK_CONFIG, entry_id="test")
+    config_entry.add_to_hass(hass)
+    session = json_load_file("session_charging.json")
+
+    mock_api.async_get_session.side_effect = lambda: EOSession.from_json(session)
+
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+    coordinator = hass.data[DOMAIN][config_entry.entry_id]
+
+    with patch(
+        "homeassistant.helpers.entity.Entity.async_write_ha_state"
+    ) as write_state:
+        await coordinator.async_refresh()
+    write_state.assert_not_called()
+
+    session["ESKWH"] += 3600
+    with patch(
+        "homeassistant.helpers.entity.Entity.async_write_ha_state"
+    ) as write_state:
+        await coordinator.async_refresh()
+    # The session and lifetime consumption
+    assert write_state.call_count == 2
+
+    assert await hass.config_entries.async_unload(config_entry.entry_id)
+
+
+async def test_lifetime_energy_accumulates_across_sessions(
+    hass, hass_storage, mock_api
+):
+    """Test the lifetime energy counts each session's energy once and is saved."""
+    config_entry = MockConfigEntry(domain=DOMAIN, data=MOCK_CONFIG, entry_id="test")
+    config_entry.add_to_hass(hass)
+    session = json_load_file("session_charging.json")
+    session["ESKWH"] = 3600 * 1000
+
+    mock_api.async_get_session.side_effect = lambda: EOSession.from_json(session)
+
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+    coordinator = hass.data[DOMAIN][config_entry.entry_id]
+    lifetime = "sensor.eo_mini_pro_2_em_12345_lifetime_consumption"
+    assert hass.states.get(lifetime).state == "1000.0"
+
+    # More energy in the same session only adds the difference
+    session["ESKWH"] = 3600 * 1500
+    await coordinator.async_refresh()
+    assert hass.states.get(lifetime).state == "1500.0"
+
+    # A new session starts counting from zero again
+    session["PiTime"] += 86400
+    session["ESKWH"] = 3600 * 200
+    await coordinator.async_refresh()
+    assert hass.states.get(lifetime).state == "1700.0"
+
+    # No session keeps the total
+    mock_api.async_get_session.side_effect = None
+    mock_api.async_get_session.return_value = None
+    await coordinator.async_refresh()
+    assert hass.states.get(lifetime).state == "1700.0"
+
+    saved = coordinator.cache.get("lifetime")
+    assert saved["total"] == 1700.0
+    assert await hass.config_entries.async_unload(config_entry.entry_id)
+
+    # The total survives a restart without the sessions being seen again
+    hass_storage[f"{DOMAIN}.test"] = {
+        "version": 1,
+        "key": f"{DOMAIN}.test",
+        "data": {"lifetime": saved},
+    }
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+    assert hass.states.get(lifetime).state == "1700.0"
+
+    assert await hass.config_entries.async_unload(config_entry.entry_id)
+
+
+async def test_scheduled_refresh_probes_liveness_between_full_polls(hass, mock_api):
+    """Test scheduled refreshes only fetch everything when due or plugged in."""
+    config_entry = MockConfigEntry(domain=DOMAIN, data=MOCK_CONFIG, entry_id="test")
+    config_entry.add_to_hass(hass)
+    mock_api.async_get_session_liveness.return_value = False
+    mock_api.async_get_session.return_value = None
+
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+    coordinator = hass.data[DOMAIN][config_entry.entry_id]
+    assert coordinator.update_interval == timedelta(seconds=LIVENESS_PROBE_INTERVAL)
+    mock_api.async_get_session.reset_mock()
+    mock_api.async_get_list.reset_mock()
+    mock_api.async_get_session_liveness.reset_mock()
+
+    now = dt_util.utcnow()
+
+    async def next_poll():
+        nonlocal now
+        now += coordinator.update_interval
+        async_fire_time_changed(hass, now)
+        await hass.async_block_till_done()
+
+    # Nothing changed, so only the probe is made
+    await next_poll()
+    assert mock_api.async_get_session_liveness.call_count == 1
+    mock_api.async_get_session.assert_not_called()
+    mock_api.async_get_list.assert_not_called()
+
+    # Plugging in is picked up by the probe and fetches the rest at once
+    mock_api.async_get_session_liveness.return_value = True
+    mock_api.async_get_session.return_value = EOSession.from_json(
+        json_load_file("session_charging.json")
+    )
+    await next_poll()
+    assert mock_api.async_get_session_liveness.call_count == 2
+    mock_api.async_get_session.assert_called_once()
+    mock_api.async_get_list.assert_called_once()
+    vehicle_connected = "binary_sensor.eo_mini_pro_2_em_12345_vehicle_connected"
+    assert hass.states.get(vehicle_connected).state == "on"
+
+    # Refreshes asked for directly always fetch everything
+    await coordinator.async_refresh()
+    assert mock_api.async_get_session.call_count == 2
+
+    assert await hass.config_entries.async_unload(config_entry.entry_id)
+
+
+async def test_refresh_only_updates_listeners_of_changed_fields(hass, mock_api):
+    """Test listeners subscribed to unchanged fields aren't woken by a refresh."""
+    config_entry = MockConfigEntry(domain=DOMAIN, data=MOCK_CONFIG, entry_id="test")
+    config_entry.add_to_hass(hass)
+    session = json_load_file("session_charging.json")
+
+    mock_api.async_get_session.side_effect = lambda: EOSession.from_json(session)
+
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+    coordinator = hass.data[DOMAIN][config_entry.entry_id]
+
+    updated = []
+    coordinator.async_add_listener(
+        lambda: updated.append("lock"), frozenset({("EM-12345", "is_disabled")})
+    )
+    coordinator.async_add_listener(
+        lambda: updated.append("energy"), frozenset({("EM-12345", "eskwh")})
+    )
+
+    session["ESKWH"] += 3600
+    await coordinator.async_refresh()
+
+    assert updated == ["energy"]
+
+    assert await hass.config_entries.async_unload(config_entry.entry_id)
+
+
+async def test_diagnostics(hass, mock_api):
+    """Test the diagnostics report where refresh time goes without credentials."""
+    config_entry = MockConfigEntry(domain=DOMAIN, data=MOCK_CONFIG, entry_id="test")
+    config_entry.add_to_hass(hass)
+
+    assert await hass.config_entries.async_setup(config_entry.entry_id)
+    await hass.async_block_till_done()
+
+    diagnostics = await async_get_config_entry_diagnostics(hass, config_entry)
+    assert diagnostics["entry"]["data"][CONF_PASSWORD] == REDACTED
+    assert diagnostics["refresh"]["count"] == 1
+    assert set(diagnostics["fetch_timings_ms"]) == {
+        "list",
+        "liveness",
+        "session",
+        "user",
+    }
+    assert diagnostics["devices"]["EM-12345"]["address"] == REDACTED
+    assert diagnostics["session"]["ESKWH"] == 81322788
+
+    assert await hass.config_entries.async_unload(config_entry.entry_id)
@@ -0,0 +1,72 @@
+"Test the adaptive polling scheduler."
+
+from datetime import timedelta
+
+from custom_components.eo_mini.models import EOSession
+from custom_components.eo_mini.scheduler import EOPollScheduler
+from tests import json_load_file
+
+CHARGING = timedelta(seconds=30)
+CONNECTED = timedelta(minutes=5)
+IDLE = timedelta(minutes=30)
+
+
+def make_scheduler():
+    "Create a scheduler with distinct intervals for each state"
+    return EOPollScheduler(charging=CHARGING, connected=CONNECTED, idle=IDLE)
+
+
+def session_with(eskwh):
+    "The example charging session with the given energy reading"
+    session = json_load_file("session_charging.json")
+    session["ESKWH"] = eskwh
+    return EOSession.from_json(session)
+
+
+def test_idle_when_nothing_connected():
+    "Nothing plugged in polls slowly"
+    scheduler = make_scheduler()
+    assert scheduler.next_interval(False, None) == IDLE
+    assert scheduler.next_interval(False, None) == IDLE
+
+
+def test_fast_while_energy_rising():
+    "Polls quickly while the session energy keeps increasing"
+    scheduler = make_scheduler()
+    assert scheduler.next_interval(True, session_with(100)) == CONNECTED
+    assert scheduler.next_interval(True, session_with(200)) == CHARGING
+    assert scheduler.next_interval(True, session_with(200)) == CONNECTED
+
+
+def test_fast_when_vehicle_plugged_in():
+    "A change in connection state is followed up quickly"
+    scheduler = make_scheduler()
+    assert scheduler.next_interval(False, None) == IDLE
+    assert scheduler.next_interval(True, session_with(0)) == CHARGING
+    assert scheduler.next_interval(True, session_with(0)) == CONNECTED
+
+
+def test_fast_after_lock_toggle():
+    "Toggling the lock polls quickly to confirm the new state"
+    scheduler = make_scheduler()
+    assert scheduler.next_interval(False, None) == IDLE
+    scheduler.note_lock_toggle()
+    assert scheduler.next_interval(False, None) == CHARGING
+
+
+def test_probes_between_full_polls():
+    "With a probe interval, polls are capped at it and full polls wait their turn"
+    probe = timedelta(minutes=1)
+    scheduler = EOPollScheduler(
+        charging=CHARGING, connected=CONNECTED, idle=IDLE, probe=probe
+    )
+    assert scheduler.full_fetch_due
+
+    assert scheduler.next_interval(False, None) == probe
+    assert not scheduler.full_fetch_due
+
+    # Charging polls are already quicker than the probe
+    assert scheduler.next_interval(True, session_with(0)) == CHARGING
+
+    scheduler.note_lock_toggle()
+    assert scheduler.full_fetch_due
@@ -0,0 +1,92 @@
+"Test the EO Mini lock switch."
+from datetime import timedelta
+from unittest.mock import patch
+
+from homeassistant.components.switch import DOMAIN as SWITCH_DOMAIN
+from homeassistant.const import ATTR_ENTITY_ID, SERVICE_TURN_OFF, SERVICE_TURN_ON
+from homeassistant.util import dt as dt_util
+from pytest_homeassistant_custom_component.common import (
+    MockConfigEntry,
+    async_fire_time_changed,
+)
+
+from custom_components.eo_mini.const import DOMAIN
+from custom_components.eo_mini.models import EOMini
+from tests import json_load_file
+
+from .const import MOCK_CONFIG
+
+LOCK = "switch.eo_mini_pro_2_em_12345_lock"
+
+
+async def toggle(hass, service):
+    "Call a switch service on the lock"
+    await hass.services.async_call(
+        SWITCH_DOMAIN, service, {ATTR_ENTITY_ID: LOCK}, blocking=True
+    )
+
+
+async def test_lock_is_optimistic_and_coalesced(hass, mock_api):
+    """Test quick toggles show immediately and send only the final state."""
+    config_entry = MockConfigEntry(domain=DOMAIN, data=MOCK_CONFIG, entry_id="test")
+    config_entry.add_to_hass(hass)
+    minis = json_load_file("list.json")
+
+    def disable(_address):
+        minis[0]["isDisabled"] = 1
+
+    mock_api.async_get_list.side_effect = lambda: EOMini.from_json_list(minis)
+
+    with patch(
+        "custom_components.eo_mini.EOApiClient.async_post_disable",
+        side_effect=disable,
+    ) as post_disable, patch(
+        "custom_components.eo_mini.EOApiClient.async_post_enable",
+    ) as post_enable:
+        assert await hass.config_entries.async_setup(config_entry.entry_id)
+        await hass.async_block_till_done()
+        assert hass.states.get(LOCK).state == "off"
+
+        await toggle(hass, SERVICE_TURN_ON)
+        assert hass.states.get(LOCK).state == "on"
+        await toggle(hass, SERVICE_TURN_OFF)
+        await toggle(hass, SERVICE_TURN_ON)
+        assert hass.states.get(LOCK).state == "on"
+        post_disable.assert_not_called()
+
+        async_fire_time_changed(hass, dt_util.utcnow() + timedelta(seconds=3))
+        await hass.async_block_till_done()
+
+        post_disable.assert_called_once_with("0000ABCD")
+        post_enable.assert_not_called()
+        assert mock_api.async_get_list.call_count == 2
+        assert hass.states.get(LOCK).state == "on"
+
+        # Polling speeds up to pick up the change on the charger
+        coordinator = hass.data[DOMAIN][config_entry.entry_id]
+        assert coordinator.update_interval == coordinator.scheduler.charging
+
+    assert await hass.config_entries.async_unload(config_entry.entry_id)
+
+
+async def test_lock_reverts_when_cloud_disagrees(hass, mock_api):
+    """Test the optimistic state is reverted if the charger didn't change."""
+    config_entry = MockConfigEntry(domain=DOMAIN, data=MOCK_CONFIG, entry_id="test")
+    config_entry.add_to_hass(hass)
+
+    with patch(
+        "custom_components.eo_mini.EOApiClient.async_post_disable",
+    ) as post_disable:
+        assert await hass.config_entries.async_setup(config_entry.entry_id)
+        await hass.async_block_till_done()
+
+        await toggle(hass, SERVICE_TURN_ON)
+        assert hass.states.get(LOCK).state == "on"
+
+        async_fire_time_changed(hass, dt_util.utcnow() + timedelta(seconds=3))
+        await hass.async_block_till_done()
+
+        post_disable.assert_called_once()
+        assert hass.states.get(LOCK).state == "off"
+
+    assert await hass.config_entries.async_unload(config_entry.entry_id)